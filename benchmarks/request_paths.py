@@ -0,0 +1,274 @@
+"""Latency and query counts of the main request paths on a synthetic catalog.
+
+Seeds a throwaway database with a generated recipe catalog and a number of
+goals with plans, then drives each view through the Django test client and
+reports p50/p99 latency and queries per request. Results are written as JSON
+so runs can be compared:
+
+    python benchmarks/request_paths.py --recipes 10000 --output after.json
+    python benchmarks/request_paths.py --recipes 10000 --compare before.json
+
+Seeding 100k recipes takes a while; pass --database to keep the seeded file
+and reuse it on later runs.
+"""
+import argparse
+from datetime import date, datetime, timezone
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from support import percentile, setup_django
+
+MEAL_TYPES = ['breakfast', 'lunch', 'dinner', 'snack']
+
+# Calorie range of the synthetic recipes of each meal type
+CALORIE_RANGES = {
+    'breakfast': (200, 700),
+    'lunch': (300, 900),
+    'dinner': (350, 1100),
+    'snack': (80, 400),
+}
+
+DIETS = ['vegetarian', 'vegan', 'keto', 'paleo', 'gluten-free', 'mediterranean']
+
+INGREDIENTS = [
+    '100 g oats', '200 ml milk', '50 g berries', '1 tbsp honey', '30 g almonds', '2 eggs',
+    '150 g chicken breast', '100 g rice', '80 g quinoa', '50 g spinach', '1 tomato',
+    '1 cucumber', '150 g salmon', '100 g broccoli', '1 tbsp olive oil', '100 g pasta',
+    '200 g tofu', '1 avocado', '2 slices bread', '150 g greek yogurt', '1 banana',
+    '100 g chickpeas', '50 g feta cheese', '1 onion', '2 cloves garlic', '100 g beef',
+    '1 cup coconut milk', '1 tsp salt', '1 apple', '2 tbsp peanut butter',
+]
+
+PATHS = ['create_health_goal', 'view_meal_plan', 'view_grocery_list', 'dashboard', 'recipe_list']
+
+
+def seed_catalog(count, rng, batch_size=2000):
+    from django.db import transaction
+
+    from myapp.cache import bump_catalog_version
+    from myapp.catalog import sync_recipe_index
+    from myapp.models import Recipe
+
+    for start in range(0, count, batch_size):
+        recipes = []
+        for number in range(start, min(start + batch_size, count)):
+            meal_type = MEAL_TYPES[number % len(MEAL_TYPES)]
+            low, high = CALORIE_RANGES[meal_type]
+            recipes.append(Recipe(
+                name=f'Synthetic {meal_type} {number:06}',
+                description=f'Generated {meal_type} recipe number {number}',
+                calories=rng.randint(low, high),
+                protein_g=round(rng.uniform(3, 60), 1),
+                carbs_g=round(rng.uniform(5, 120), 1),
+                fat_g=round(rng.uniform(1, 50), 1),
+                prep_time_min=rng.randint(5, 90),
+                ingredients=', '.join(rng.sample(INGREDIENTS, rng.randint(3, 8))),
+                instructions='1. Prepare\n2. Cook\n3. Serve',
+                diet_types=', '.join(rng.sample(DIETS, rng.randint(0, 3))),
+                meal_type=meal_type,
+            ))
+        with transaction.atomic():
+            # bulk_create skips post_save, so index the batch like import_recipes does
+            sync_recipe_index(Recipe.objects.bulk_create(recipes))
+    bump_catalog_version()
+
+
+def goal_data(rng, number):
+    from myapp.models import HealthGoal
+
+    return {
+        'user_name': f'Bench user {number}',
+        'goal': rng.choice(HealthGoal.GOAL_CHOICES)[0],
+        'diet_type': rng.choice(HealthGoal.DIET_TYPE_CHOICES)[0],
+        'daily_calories': rng.randrange(1500, 3200, 50),
+        'allergies': rng.choice(['', '', 'peanut', 'shellfish']),
+        'dislikes': rng.choice(['', '', 'broccoli', 'tofu, mushrooms']),
+    }
+
+
+def seed_goals(count, rng):
+    from django.db import transaction
+    from django.test import override_settings
+
+    from myapp.forms import HealthGoalForm
+    from myapp.models import MealPlan
+    from myapp.views import generate_grocery_list, generate_meal_plan
+
+    # Seeding should not pay for the optimizing engine's time budget
+    with override_settings(MEAL_PLAN_ENGINE='myapp.planning.RandomEngine'):
+        for number in range(count):
+            form = HealthGoalForm(goal_data(rng, number))
+            form.is_valid()
+            with transaction.atomic():
+                health_goal = form.save()
+                meal_plan = MealPlan.objects.create(health_goal=health_goal, start_date=date.today())
+                generate_grocery_list(meal_plan, generate_meal_plan(meal_plan, health_goal))
+
+
+def request_factories(rng):
+    """Map each benchmarked path to a callable issuing one request with a test client"""
+    from django.urls import reverse
+
+    from myapp.models import MealPlan, Recipe
+
+    plan_ids = list(MealPlan.objects.values_list('pk', flat=True))
+    recipe_filters = [
+        {},
+        {'meal_type': 'dinner'},
+        {'min_calories': 300, 'max_calories': 600},
+        {'diet': 'vegan', 'max_prep_time': 30},
+    ]
+    counter = iter(range(10 ** 9))
+
+    def create_health_goal(client):
+        return client.post(reverse('myapp:create_health_goal'), goal_data(rng, f'new {next(counter)}'))
+
+    def view_meal_plan(client):
+        return client.get(reverse('myapp:view_meal_plan', args=[rng.choice(plan_ids)]))
+
+    def view_grocery_list(client):
+        return client.get(reverse('myapp:view_grocery_list', args=[rng.choice(plan_ids)]))
+
+    def dashboard(client):
+        return client.get(reverse('myapp:dashboard'))
+
+    def recipe_list(client):
+        return client.get(reverse('myapp:recipe_list'), rng.choice(recipe_filters))
+
+    assert Recipe.objects.exists(), 'the catalog is empty'
+    return {
+        'create_health_goal': create_health_goal,
+        'view_meal_plan': view_meal_plan,
+        'view_grocery_list': view_grocery_list,
+        'dashboard': dashboard,
+        'recipe_list': recipe_list,
+    }
+
+
+def measure(issue, iterations, warmup, cold):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from myapp.cache import local_cache
+
+    client = Client()
+    latencies, queries = [], []
+    for iteration in range(warmup + iterations):
+        if cold:
+            cache.clear()
+            local_cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = issue(client)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f'request failed with status {response.status_code}')
+        if iteration >= warmup:
+            latencies.append(elapsed)
+            queries.append(len(captured))
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'queries_median': percentile(queries, 0.50),
+        'queries_max': max(queries),
+    }
+
+
+def print_results(report, baseline=None):
+    print(f'{report["meta"]["recipes"]} recipes, {report["meta"]["goals"]} goals, '
+          f'{report["meta"]["iterations"]} requests per path'
+          f'{" (cold cache)" if report["meta"]["cold_cache"] else ""}')
+    print(f'{"path":<20} {"p50 ms":>9} {"p99 ms":>9} {"queries":>8}{"   p50 vs baseline" if baseline else ""}')
+    for path, row in report['results'].items():
+        line = f'{path:<20} {row["p50_ms"]:>9.2f} {row["p99_ms"]:>9.2f} {row["queries_median"]:>8}'
+        before = (baseline or {}).get('results', {}).get(path)
+        if before and before['p50_ms']:
+            change = (row['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+            line += f'   {change:+7.1f}% ({before["queries_median"]} queries before)'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=1000, help='Size of the synthetic catalog (e.g. 1000, 10000, 100000)')
+    parser.add_argument('--goals', type=int, default=200, help='Goals with a generated plan to seed')
+    parser.add_argument('--iterations', type=int, default=50, help='Measured requests per path')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per path first')
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS)
+    parser.add_argument('--cold-cache', action='store_true', help='Clear the catalog caches before every request')
+    parser.add_argument('--database', help='SQLite file to seed, or to reuse if it is already seeded')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the data and the requests')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--compare', help='JSON report of an earlier run to compare against')
+    args = parser.parse_args()
+
+    temporary = None
+    if args.database:
+        path = Path(args.database).resolve()
+    else:
+        temporary = tempfile.TemporaryDirectory()
+        path = Path(temporary.name) / 'bench.sqlite3'
+    # Production-like: no DEBUG query log and no test-runner template instrumentation
+    setup_django(path, DEBUG=False, ALLOWED_HOSTS=['testserver'])
+
+    import django
+    from django.core.management import call_command
+
+    from myapp.models import HealthGoal, Recipe
+
+    rng = random.Random(args.seed)
+    call_command('migrate', verbosity=0)
+    if not Recipe.objects.exists():
+        started = time.perf_counter()
+        seed_catalog(args.recipes, rng)
+        seed_goals(args.goals, rng)
+        print(f'Seeded {args.recipes} recipes and {args.goals} goals in {time.perf_counter() - started:.1f}s',
+              file=sys.stderr)
+
+    recipes, goals = Recipe.objects.count(), HealthGoal.objects.count()
+    factories = request_factories(rng)
+    results = {}
+    for name in args.paths:
+        results[name] = measure(factories[name], args.iterations, args.warmup, args.cold_cache)
+        print(f'{name}: p50 {results[name]["p50_ms"]:.2f} ms', file=sys.stderr)
+
+    report = {
+        'meta': {
+            'recipes': recipes,
+            'goals': goals,
+            'iterations': args.iterations,
+            'cold_cache': args.cold_cache,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+    if args.output or baseline:
+        print_results(report, baseline)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if temporary is not None:
+        temporary.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Writer/reader throughput of the SQLite database profiles under concurrency.
+
+Runs the same workload against a fresh copy of a migrated, seeded database,
+once with Django's stock SQLite settings and once with the tuned profile in
+project/settings.py. Writers persist a goal, plan, week and grocery list in
+one transaction, as create_health_goal does; readers load a plan the way
+view_meal_plan does. Each operation ends like a request, so connections
+are reused or closed according to the profile's CONN_MAX_AGE.
+
+    python benchmarks/sqlite_concurrency.py --writers 4 --readers 8 --duration 10
+"""
+import argparse
+from datetime import date
+import io
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from support import percentile, setup_django
+
+# Engine cost is not what is being measured here
+PLANNING = {'MEAL_PLAN_ENGINE': 'myapp.planning.RandomEngine'}
+
+SEED_PLANS = 20
+
+
+def prepare(path):
+    setup_django(path, 'stock', **PLANNING)
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    call_command('load_recipes', stdout=io.StringIO())
+    for _ in range(SEED_PLANS):
+        write_plan(random.Random())
+
+
+def write_plan(rng):
+    from django.db import transaction
+
+    from myapp.models import HealthGoal, MealPlan
+    from myapp.views import generate_grocery_list, generate_meal_plan, plan_week
+
+    goal = HealthGoal(
+        user_name=f'Bench {rng.randrange(10 ** 6)}',
+        goal=rng.choice(['weight_loss', 'muscle_gain', 'maintenance']),
+        diet_type='balanced',
+        daily_calories=rng.randrange(1600, 2800),
+    )
+    week = plan_week(goal)
+    with transaction.atomic():
+        goal.save()
+        meal_plan = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        daily_meals = generate_meal_plan(meal_plan, goal, week=week)
+        generate_grocery_list(meal_plan, daily_meals)
+
+
+def read_plan(rng):
+    from myapp.models import MealPlan
+
+    meal_plan = MealPlan.objects.select_related('health_goal').filter(pk=rng.randrange(1, SEED_PLANS + 1)).first()
+    if meal_plan is not None:
+        list(meal_plan.meals.select_related('breakfast', 'lunch', 'dinner', 'snack'))
+        list(meal_plan.grocery_items.all())
+
+
+def worker(path, profile, role, duration, barrier, results):
+    setup_django(path, profile, **PLANNING)
+    from django.db import OperationalError, close_old_connections
+
+    operation = write_plan if role == 'writer' else read_plan
+    rng = random.Random(os.getpid())
+    latencies = []
+    errors = 0
+    barrier.wait()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            operation(rng)
+        except OperationalError:
+            errors += 1
+        else:
+            latencies.append(time.monotonic() - started)
+        # End of "request": close or keep the connection per CONN_MAX_AGE
+        close_old_connections()
+    results.put({'role': role, 'latencies': latencies, 'errors': errors})
+
+
+def run_profile(template, profile, args, context):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.sqlite3')
+        shutil.copy(template, path)
+
+        barrier = context.Barrier(args.writers + args.readers)
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(path, profile, role, args.duration, barrier, results))
+            for role in ['writer'] * args.writers + ['reader'] * args.readers
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    summary = {'profile': profile}
+    for role in ('writer', 'reader'):
+        latencies = [value for outcome in outcomes if outcome['role'] == role for value in outcome['latencies']]
+        summary[role] = {
+            'ops_per_s': len(latencies) / args.duration,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'errors': sum(outcome['errors'] for outcome in outcomes if outcome['role'] == role),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per profile')
+    parser.add_argument('--profiles', nargs='+', default=['stock', 'tuned'], choices=['stock', 'tuned'])
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        template = os.path.join(directory, 'template.sqlite3')
+        process = context.Process(target=prepare, args=(template,))
+        process.start()
+        process.join()
+        if process.exitcode:
+            sys.exit('Preparing the benchmark database failed')
+        summaries = [run_profile(template, profile, args, context) for profile in args.profiles]
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+        return
+    print(f'{args.writers} writers, {args.readers} readers, {args.duration:g}s per profile')
+    print(f'{"profile":<8} {"role":<7} {"ops/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for summary in summaries:
+        for role in ('writer', 'reader'):
+            row = summary[role]
+            print(f'{summary["profile"]:<8} {role:<7} {row["ops_per_s"]:>8.1f} '
+                  f'{row["p50_ms"]:>8.1f} {row["p99_ms"]:>8.1f} {row["errors"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Helpers shared by the benchmark scripts.
+
+The scripts run from the command line, outside the test runner, against a
+throwaway SQLite file so they never touch the project's database.
+"""
+import os
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django(path, profile='tuned', **overrides):
+    """Point the project settings at the database ``path``, then set up Django.
+
+    ``profile`` 'tuned' keeps the DATABASES options of project/settings.py;
+    'stock' uses Django's SQLite defaults. ``overrides`` replace other settings.
+    """
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    from django.conf import settings
+
+    if profile == 'stock':
+        database = {'ENGINE': 'django.db.backends.sqlite3'}
+    else:
+        database = dict(settings.DATABASES['default'])
+    database['NAME'] = str(path)
+    settings.DATABASES['default'] = database
+    # Keep the shared file cache out of it; only this process is measured.
+    # Other aliases (e.g. the in-memory fragment cache) stay as configured
+    locmem = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    settings.CACHES = {**settings.CACHES, 'default': locmem, 'catalog-version': {**locmem, 'LOCATION': 'version'}}
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    import django
+
+    django.setup()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values``; 0.0 when there are none"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
@@ -0,0 +1,244 @@
+"""Throughput of the read-heavy pages served through WSGI and through ASGI.
+
+Seeds a throwaway database like request_paths.py, then calls the project's
+WSGI and ASGI applications directly, with no server in between, at the same
+fixed concurrency: N threads each issuing requests against the WSGI
+application, and N asyncio tasks against the ASGI application in one event
+loop. Requests cycle through dashboard, recipe_list, recipe_detail,
+view_meal_plan and view_grocery_list.
+
+    python benchmarks/wsgi_vs_asgi.py --concurrency 32 --duration 10
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from request_paths import seed_catalog, seed_goals
+from support import percentile, setup_django
+
+HOST = 'testserver'
+
+PATHS = ['dashboard', 'recipe_list', 'recipe_detail', 'view_meal_plan', 'view_grocery_list']
+
+
+def targets(rng, count=200):
+    """``(path, query_string)`` pairs to request, mixing the benchmarked pages"""
+    from urllib.parse import urlencode
+
+    from django.urls import reverse
+
+    from myapp.models import MealPlan, Recipe
+
+    plan_ids = list(MealPlan.objects.values_list('pk', flat=True))
+    recipe_ids = list(Recipe.objects.values_list('pk', flat=True)[:1000])
+    recipe_filters = [{}, {'meal_type': 'dinner'}, {'min_calories': 300, 'max_calories': 600}]
+    pages = {
+        'dashboard': lambda: (reverse('myapp:dashboard'), ''),
+        'recipe_list': lambda: (reverse('myapp:recipe_list'), urlencode(rng.choice(recipe_filters))),
+        'recipe_detail': lambda: (reverse('myapp:recipe_detail', args=[rng.choice(recipe_ids)]), ''),
+        'view_meal_plan': lambda: (reverse('myapp:view_meal_plan', args=[rng.choice(plan_ids)]), ''),
+        'view_grocery_list': lambda: (reverse('myapp:view_grocery_list', args=[rng.choice(plan_ids)]), ''),
+    }
+    return [pages[PATHS[number % len(PATHS)]]() for number in range(count)]
+
+
+def wsgi_environ(path, query_string):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': HOST,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def run_wsgi(application, urls, concurrency, duration):
+    """Latencies and failures of ``concurrency`` threads calling the WSGI application"""
+    barrier = threading.Barrier(concurrency)
+
+    def client(offset):
+        latencies, failures = [], 0
+        barrier.wait()
+        deadline = time.monotonic() + duration
+        number = offset
+        while time.monotonic() < deadline:
+            path, query_string = urls[number % len(urls)]
+            number += 1
+            statuses = []
+            started = time.monotonic()
+            body = application(wsgi_environ(path, query_string), lambda status, headers: statuses.append(status))
+            try:
+                for _ in body:
+                    pass
+            finally:
+                # Fires request_finished, which closes or keeps the connection
+                body.close()
+            latencies.append(time.monotonic() - started)
+            failures += int(statuses[0].split()[0]) >= 400
+        return latencies, failures
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        outcomes = list(executor.map(client, range(concurrency)))
+    return [value for latencies, _ in outcomes for value in latencies], sum(failures for _, failures in outcomes)
+
+
+async def asgi_request(application, path, query_string):
+    """Issue one GET to the ASGI application and return its status code"""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': query_string.encode(),
+        'headers': [(b'host', HOST.encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': (HOST, 80),
+    }
+    done = asyncio.Event()
+    body_sent = False
+    status = None
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Django listens for a disconnect while the view runs; only hang up
+        # once the whole response has arrived
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            done.set()
+
+    await application(scope, receive, send)
+    return status
+
+
+def run_asgi(application, urls, concurrency, duration):
+    """Latencies and failures of ``concurrency`` tasks calling the ASGI application"""
+
+    async def client(offset, deadline):
+        latencies, failures = [], 0
+        number = offset
+        while time.monotonic() < deadline:
+            path, query_string = urls[number % len(urls)]
+            number += 1
+            started = time.monotonic()
+            status = await asgi_request(application, path, query_string)
+            latencies.append(time.monotonic() - started)
+            failures += status >= 400
+        return latencies, failures
+
+    async def main():
+        deadline = time.monotonic() + duration
+        return await asyncio.gather(*(client(offset, deadline) for offset in range(concurrency)))
+
+    outcomes = asyncio.run(main())
+    return [value for latencies, _ in outcomes for value in latencies], sum(failures for _, failures in outcomes)
+
+
+def summarize(mode, latencies, failures, duration):
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'requests_per_s': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'failures': failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=32, help='Threads (WSGI) or tasks (ASGI) issuing requests')
+    parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per mode')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured seconds per mode first')
+    parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi'], choices=['wsgi', 'asgi'])
+    parser.add_argument('--recipes', type=int, default=1000, help='Size of the synthetic catalog')
+    parser.add_argument('--goals', type=int, default=200, help='Goals with a generated plan to seed')
+    parser.add_argument('--database', help='SQLite file to seed, or to reuse if it is already seeded')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the data and the requests')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    temporary = None
+    if args.database:
+        path = Path(args.database).resolve()
+    else:
+        temporary = tempfile.TemporaryDirectory()
+        path = Path(temporary.name) / 'bench.sqlite3'
+    setup_django(path, DEBUG=False, ALLOWED_HOSTS=[HOST])
+
+    from django.core.asgi import get_asgi_application
+    from django.core.management import call_command
+    from django.core.wsgi import get_wsgi_application
+
+    from myapp.models import Recipe
+
+    rng = random.Random(args.seed)
+    call_command('migrate', verbosity=0)
+    if not Recipe.objects.exists():
+        started = time.perf_counter()
+        seed_catalog(args.recipes, rng)
+        seed_goals(args.goals, rng)
+        print(f'Seeded {args.recipes} recipes and {args.goals} goals in {time.perf_counter() - started:.1f}s',
+              file=sys.stderr)
+    recipes = Recipe.objects.count()
+    urls = targets(rng)
+
+    runners = {
+        'wsgi': (get_wsgi_application, run_wsgi),
+        'asgi': (get_asgi_application, run_asgi),
+    }
+    summaries = []
+    for mode in args.modes:
+        get_application, run = runners[mode]
+        application = get_application()
+        if args.warmup:
+            run(application, urls, args.concurrency, args.warmup)
+        latencies, failures = run(application, urls, args.concurrency, args.duration)
+        summaries.append(summarize(mode, latencies, failures, args.duration))
+
+    if temporary is not None:
+        temporary.cleanup()
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+        return
+    print(f'{args.concurrency} concurrent clients, {args.duration:g}s per mode, {recipes} recipes')
+    print(f'{"mode":<6} {"req/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"failures":>9}')
+    for row in summaries:
+        print(f'{row["mode"]:<6} {row["requests_per_s"]:>9.1f} {row["p50_ms"]:>9.2f} '
+              f'{row["p99_ms"]:>9.2f} {row["failures"]:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,12 @@
+from collections import Counter, defaultdict
+
 from django.contrib import admin
-from .models import HealthGoal, Recipe, MealPlan, DailyMeal, GroceryItem
+from django.db import transaction
+from django.utils import timezone
+
+from .groceries import aggregate_ingredients, apply_ledger_delta, recipe_counts
+from .models import HealthGoal, Recipe, MealPlan, DailyMeal, GroceryItem, GenerationJob
+from .search import has_fts, matching_recipes
 
 
 @admin.register(HealthGoal)
@@ -13,7 +20,7 @@ class HealthGoalAdmin(admin.ModelAdmin):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('name', 'meal_type', 'calories', 'protein_g', 'prep_time_min')
-    list_filter = ('meal_type', 'diet_types')
+    list_filter = ('meal_type', 'diet_tags')
     search_fields = ('name', 'description', 'ingredients')
     fieldsets = (
         ('Basic Info', {'fields': ('name', 'description', 'meal_type')}),
@@ -22,29 +29,94 @@ class RecipeAdmin(admin.ModelAdmin):
         ('Diets', {'fields': ('diet_types',)}),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of a LIKE scan of every row
+        if not search_term.strip() or not has_fts():
+            return super().get_search_results(request, queryset, search_term)
+        return matching_recipes(search_term, queryset), False
+
 
 @admin.register(MealPlan)
 class MealPlanAdmin(admin.ModelAdmin):
-    list_display = ('health_goal', 'start_date', 'created_at')
-    list_filter = ('start_date', 'created_at')
+    list_display = ('health_goal', 'start_date', 'days', 'status', 'created_at')
+    list_filter = ('status', 'start_date', 'created_at')
     search_fields = ('health_goal__user_name',)
     readonly_fields = ('created_at',)
 
 
+class PlanPartAdmin(admin.ModelAdmin):
+    """Admin of rows that belong to a meal plan; edits touch the plan so its ETag changes"""
+
+    def save_model(self, request, obj, form, change):
+        # A row moved to another plan changes both
+        old_plan_id = form.initial.get('meal_plan') if change else None
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            touch_plans({obj.meal_plan_id, old_plan_id} - {None})
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            MealPlan.touch(obj.meal_plan_id)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            plan_ids = set(queryset.values_list('meal_plan_id', flat=True))
+            super().delete_queryset(request, queryset)
+            touch_plans(plan_ids)
+
+
+def touch_plans(plan_ids):
+    MealPlan.objects.filter(pk__in=plan_ids).update(updated_at=timezone.now())
+
+
+def update_ledgers(removed, added):
+    """Apply the servings of the ``removed`` days leaving and the ``added`` days arriving to their plans' ledgers"""
+    servings = defaultdict(Counter)
+    for daily_meal in added:
+        servings[daily_meal.meal_plan_id].update(recipe_counts([daily_meal]))
+    for daily_meal in removed:
+        servings[daily_meal.meal_plan_id].subtract(recipe_counts([daily_meal]))
+    for plan_id, counts in servings.items():
+        apply_ledger_delta(plan_id, aggregate_ingredients(counts))
+
+
 @admin.register(DailyMeal)
-class DailyMealAdmin(admin.ModelAdmin):
-    list_display = ('meal_plan', 'day_number', 'get_total_calories')
+class DailyMealAdmin(PlanPartAdmin):
+    list_display = ('meal_plan', 'day_number', 'date', 'total_calories', 'total_protein_g', 'total_carbs_g', 'total_fat_g')
     list_filter = ('meal_plan', 'day_number')
+    list_select_related = ('meal_plan__health_goal',)
     search_fields = ('meal_plan__health_goal__user_name',)
+    readonly_fields = ('total_calories', 'total_protein_g', 'total_carbs_g', 'total_fat_g')
 
-    def get_total_calories(self, obj):
-        return obj.get_total_calories()
-    get_total_calories.short_description = 'Total Calories'
+    def save_model(self, request, obj, form, change):
+        obj.compute_totals()
+        with transaction.atomic():
+            removed = [DailyMeal.objects.get(pk=obj.pk)] if change else []
+            super().save_model(request, obj, form, change)
+            update_ledgers(removed, [obj])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            update_ledgers([obj], [])
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            update_ledgers(list(queryset), [])
+            super().delete_queryset(request, queryset)
 
 
 @admin.register(GroceryItem)
-class GroceryItemAdmin(admin.ModelAdmin):
+class GroceryItemAdmin(PlanPartAdmin):
     list_display = ('name', 'category', 'quantity', 'meal_plan', 'purchased')
     list_filter = ('category', 'purchased', 'meal_plan')
     search_fields = ('name',)
-    readonly_fields = ('meal_plan',)
+    readonly_fields = ('meal_plan', 'ingredient', 'base_unit', 'amount', 'ref_count')
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('meal_plan', 'status', 'attempts', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('meal_plan', 'attempts', 'error', 'created_at', 'started_at', 'finished_at')
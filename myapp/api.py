@@ -0,0 +1,264 @@
+"""JSON endpoints for meal plans, days, grocery items and recipes.
+
+Rows are serialized straight from ``values()`` querysets, so no model
+instances are built. GET endpoints accept ``?fields=a,b`` to return only
+some of the allowed fields, and are gzip-compressed when the client accepts
+it. Writes are CSRF-exempt for non-browser clients, so they must be sent as
+``application/json``, which browsers cannot do cross-site without a CORS
+preflight; that includes the writes without a body.
+"""
+from functools import wraps
+import json
+
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET, require_POST
+
+from .forms import HealthGoalForm, RecipeFilterForm
+from .models import DailyMeal, GroceryItem, MealPlan, Recipe
+from .pagination import keyset_page
+from .planning import MEAL_SLOTS
+from .views import create_goal_with_plan, replan_day
+
+PLAN_FIELDS = [
+    'id', 'health_goal_id', 'health_goal__user_name', 'health_goal__goal', 'health_goal__diet_type',
+    'health_goal__daily_calories', 'start_date', 'days', 'seed', 'status', 'created_at', 'updated_at',
+]
+
+DAY_FIELDS = [
+    'id', 'day_number', 'date', 'breakfast_id', 'lunch_id', 'dinner_id', 'snack_id',
+    'total_calories', 'total_protein_g', 'total_carbs_g', 'total_fat_g',
+]
+
+GROCERY_FIELDS = ['id', 'name', 'quantity', 'category', 'estimated_price', 'purchased']
+
+RECIPE_FIELDS = [
+    'id', 'name', 'description', 'meal_type', 'calories', 'protein_g', 'carbs_g', 'fat_g',
+    'prep_time_min', 'ingredients', 'instructions', 'diet_types',
+]
+
+# The large text fields are left out of lists unless asked for
+RECIPE_LIST_FIELDS = ['id', 'name', 'meal_type', 'calories', 'protein_g', 'carbs_g', 'fat_g', 'prep_time_min']
+
+# Recipes of a plan's days, embedded in the plan response
+PLAN_RECIPE_FIELDS = ['id', 'name', 'meal_type', 'calories', 'protein_g', 'carbs_g', 'fat_g']
+
+RECIPE_PAGE_SIZE = 100
+
+# Keyset ordering of the recipe list; these fields are always returned
+RECIPE_ORDERING = ['meal_type', 'name']
+
+
+class BadRequest(Exception):
+    pass
+
+
+def error(message, status=400, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def selected_fields(request, allowed, default=None):
+    """Fields named by ``?fields=``, validated against ``allowed``"""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(default or allowed)
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise BadRequest(f'Unknown fields: {", ".join(unknown)}. Allowed: {", ".join(allowed)}')
+    return fields
+
+
+def json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest('Request body must be JSON')
+    if not isinstance(data, dict):
+        raise BadRequest('Request body must be a JSON object')
+    return data
+
+
+def require_json(view):
+    """Reject writes not sent as application/json with a 415"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.content_type != 'application/json':
+            return error('Content-Type must be application/json', status=415)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def api_view(view):
+    """Turn BadRequest into a 400 JSON response"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as exc:
+            return error(str(exc))
+    return wrapper
+
+
+def plan_data(pk, fields):
+    return MealPlan.objects.filter(pk=pk).values(*fields).first()
+
+
+@gzip_page
+@require_GET
+@api_view
+def meal_plan(request, pk):
+    """A plan with its days and the recipes they use"""
+    fields = selected_fields(request, PLAN_FIELDS)
+    plan = plan_data(pk, fields)
+    if plan is None:
+        return error('Meal plan not found', status=404)
+
+    days = list(DailyMeal.objects.filter(meal_plan_id=pk).order_by('day_number').values(*DAY_FIELDS))
+    recipe_ids = {
+        day[slot] for day in days for slot in ('breakfast_id', 'lunch_id', 'dinner_id', 'snack_id')
+        if day[slot] is not None
+    }
+    used = Recipe.objects.filter(pk__in=recipe_ids).order_by().values(*PLAN_RECIPE_FIELDS)
+    plan['days'] = days
+    plan['recipes'] = {row['id']: row for row in used}
+    return JsonResponse(plan)
+
+
+@csrf_exempt
+@require_POST
+@require_json
+@api_view
+def create_meal_plan(request):
+    """Create a goal from the HealthGoalForm fields and generate (or queue) its plan"""
+    form = HealthGoalForm(json_body(request))
+    if not form.is_valid():
+        return error('Invalid health goal', errors=form.errors.get_json_data())
+    meal_plan = create_goal_with_plan(form)
+    response = JsonResponse(plan_data(meal_plan.pk, PLAN_FIELDS), status=201)
+    response['Location'] = reverse('myapp:api_meal_plan', args=[meal_plan.pk])
+    return response
+
+
+@gzip_page
+@require_GET
+@api_view
+def meal_plan_days(request, pk):
+    fields = selected_fields(request, DAY_FIELDS)
+    if not MealPlan.objects.filter(pk=pk).exists():
+        return error('Meal plan not found', status=404)
+    days = DailyMeal.objects.filter(meal_plan_id=pk).order_by('day_number').values(*fields)
+    return JsonResponse({'days': list(days)})
+
+
+@gzip_page
+@require_GET
+@api_view
+def grocery_items(request, pk):
+    fields = selected_fields(request, GROCERY_FIELDS)
+    if not MealPlan.objects.filter(pk=pk).exists():
+        return error('Meal plan not found', status=404)
+    items = GroceryItem.objects.filter(meal_plan_id=pk).values(*fields)
+    return JsonResponse({'items': list(items)})
+
+
+@csrf_exempt
+@require_POST
+@require_json
+@api_view
+def toggle_grocery_items(request, pk):
+    """Mark many items of a plan at once.
+
+    Body: ``{"ids": [...], "purchased": true|false}``; without ``purchased``
+    every listed item is flipped. Returns the new state of the listed items.
+    """
+    data = json_body(request)
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not all(isinstance(item_id, int) for item_id in ids):
+        raise BadRequest('"ids" must be a list of integers')
+    purchased = data.get('purchased')
+    if purchased is not None and not isinstance(purchased, bool):
+        raise BadRequest('"purchased" must be true or false')
+    if not MealPlan.objects.filter(pk=pk).exists():
+        return error('Meal plan not found', status=404)
+
+    items = GroceryItem.objects.filter(meal_plan_id=pk, pk__in=ids)
+    if purchased is None:
+        purchased = Case(When(purchased=True, then=Value(False)), default=Value(True))
+    with transaction.atomic():
+        updated = items.update(purchased=purchased)
+        if updated:
+            MealPlan.touch(pk)
+    return JsonResponse({'updated': updated, 'items': list(items.values('id', 'purchased'))})
+
+
+@gzip_page
+@require_GET
+@api_view
+def recipes(request):
+    """Keyset-paginated recipes, filtered like the recipe list page"""
+    fields = selected_fields(request, RECIPE_FIELDS, RECIPE_LIST_FIELDS)
+    form = RecipeFilterForm(request.GET)
+    if not form.is_valid():
+        return error('Invalid filters', errors=form.errors.get_json_data())
+    queryset = form.filter(Recipe.objects.all())
+    columns = fields + [name for name in RECIPE_ORDERING if name not in fields]
+    page = keyset_page(
+        queryset.values(*columns), RECIPE_ORDERING,
+        cursor=request.GET.get('cursor'), page_size=RECIPE_PAGE_SIZE,
+    )
+    return JsonResponse({'results': page.items, 'next_cursor': page.next_cursor})
+
+
+@gzip_page
+@require_GET
+@api_view
+def recipe(request, pk):
+    fields = selected_fields(request, RECIPE_FIELDS)
+    data = Recipe.objects.filter(pk=pk).values(*fields).first()
+    if data is None:
+        return error('Recipe not found', status=404)
+    return JsonResponse(data)
+
+
+def replanned_day(pk, day_number, slots):
+    """Re-pick ``slots`` of a day and describe the day and grocery changes"""
+    meal_plan = MealPlan.objects.select_related('health_goal').filter(pk=pk, status='ready').first()
+    if meal_plan is None:
+        return error('Meal plan not found', status=404)
+    try:
+        daily_meal, (created, updated, deleted) = replan_day(meal_plan, day_number, slots)
+    except DailyMeal.DoesNotExist:
+        return error('Day not found', status=404)
+    return JsonResponse({
+        'day': DailyMeal.objects.filter(pk=daily_meal.pk).values(*DAY_FIELDS).first(),
+        'grocery_items': {
+            'created': [{name: getattr(item, name) for name in GROCERY_FIELDS} for item in created],
+            'updated': [{'id': item.pk, 'quantity': item.quantity} for item in updated],
+            'deleted': [item.pk for item in deleted],
+        },
+    })
+
+
+@csrf_exempt
+@require_POST
+@require_json
+@api_view
+def regenerate_day(request, pk, day_number):
+    """Re-pick every meal of one day; the grocery list is patched, not rebuilt"""
+    return replanned_day(pk, day_number, MEAL_SLOTS)
+
+
+@csrf_exempt
+@require_POST
+@require_json
+@api_view
+def swap_meal_slot(request, pk, day_number, slot):
+    """Replace one meal of one day"""
+    if slot not in MEAL_SLOTS:
+        raise BadRequest(f'Unknown slot. Allowed: {", ".join(MEAL_SLOTS)}')
+    return replanned_day(pk, day_number, [slot])
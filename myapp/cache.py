@@ -0,0 +1,157 @@
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+CATALOG_VERSION_KEY = 'recipe-catalog-version'
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Small thread-safe, process-local least-recently-used mapping"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class Uncached:
+    """Wraps a builder's result to return it from ``cached_catalog`` without caching it"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+local_cache = LRUCache(getattr(settings, 'RECIPE_CACHE_LOCAL_SIZE', 128))
+
+
+def shared_cache():
+    return caches[getattr(settings, 'RECIPE_CACHE_ALIAS', 'default')]
+
+
+def version_cache():
+    return caches[getattr(settings, 'RECIPE_CACHE_VERSION_ALIAS', 'catalog-version')]
+
+
+def catalog_version():
+    """Current recipe catalog version, read from the cache every worker shares"""
+    cache = version_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a cleared cache never reuses an old version
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+async def acatalog_version():
+    """``catalog_version`` for async code; the cache is read off the event loop"""
+    cache = version_cache()
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+def _bump():
+    cache = version_cache()
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog entry in all workers.
+
+    Bumps now so this process stops serving the old data, and again on
+    commit so nothing cached from a read of uncommitted rows survives.
+    """
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def cached_catalog(name, builder, shared=True):
+    """Return ``builder()`` cached under ``name`` for the current catalog version.
+
+    Lookups go to the process-local LRU first, then (when ``shared``) to the
+    shared cache backend; ``builder`` only runs on a miss in both. Entries of
+    older versions are never read again and simply age out. A builder may
+    return an ``Uncached`` result, which is returned but not stored.
+    """
+    key, value = _lookup(name, shared)
+    if value is _MISSING:
+        value = builder()
+        if isinstance(value, Uncached):
+            return value.value
+        _store(key, value, shared)
+    return value
+
+
+async def acached_catalog(name, builder, shared=True):
+    """``cached_catalog`` for async views; ``builder`` is a coroutine function"""
+    key, value = await _alookup(name, shared)
+    if value is _MISSING:
+        value = await builder()
+        if isinstance(value, Uncached):
+            return value.value
+        await _astore(key, value, shared)
+    return value
+
+
+def _lookup(name, shared):
+    key = f'recipe-catalog:{catalog_version()}:{name}'
+    value = local_cache.get(key, _MISSING)
+    if value is _MISSING and shared:
+        value = shared_cache().get(key, _MISSING)
+        if value is not _MISSING:
+            local_cache.set(key, value)
+    return key, value
+
+
+def _store(key, value, shared):
+    if shared:
+        shared_cache().set(key, value, timeout=getattr(settings, 'RECIPE_CACHE_TIMEOUT', 86400))
+    local_cache.set(key, value)
+
+
+async def _alookup(name, shared):
+    key = f'recipe-catalog:{await acatalog_version()}:{name}'
+    value = local_cache.get(key, _MISSING)
+    if value is _MISSING and shared:
+        value = await shared_cache().aget(key, _MISSING)
+        if value is not _MISSING:
+            local_cache.set(key, value)
+    return key, value
+
+
+async def _astore(key, value, shared):
+    if shared:
+        await shared_cache().aset(key, value, timeout=getattr(settings, 'RECIPE_CACHE_TIMEOUT', 86400))
+    local_cache.set(key, value)
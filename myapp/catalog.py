@@ -0,0 +1,148 @@
+import re
+
+from django.db import transaction
+
+from .groceries import categorize, parse_ingredient
+from .models import DietTag, Ingredient, Recipe, RecipeDietTag, RecipeIngredient
+
+
+def split_list(text):
+    """Split a comma-separated field into its non-empty, stripped parts"""
+    return [part.strip() for part in (text or '').split(',') if part.strip()]
+
+
+def normalize_name(name):
+    """Lowercase a name and collapse its whitespace"""
+    return ' '.join(name.lower().split())
+
+
+def diet_slug(name):
+    """Map a diet label such as 'Gluten-Free' to its HealthGoal value 'gluten_free'"""
+    return '_'.join(normalize_name(name).replace('-', ' ').split())
+
+
+def singularize(word):
+    """Naive English singular so 'berries' matches 'berry' and 'eggs' matches 'egg'"""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith(('oes', 'ches', 'shes', 'xes')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us')):
+        return word[:-1]
+    return word
+
+
+def name_tokens(name):
+    """Return every contiguous word sequence of a normalized, singularized name.
+
+    'Mixed berries' yields {'mixed', 'berry', 'mixed berry'}, so an exclusion
+    term matches when it appears anywhere in the ingredient as whole words.
+    """
+    words = [singularize(word) for word in re.findall(r"[a-z0-9']+", name.lower())]
+    return {
+        ' '.join(words[start:end])
+        for start in range(len(words))
+        for end in range(start + 1, len(words) + 1)
+    }
+
+
+class ExclusionMatcher:
+    """Allergy and dislike terms compiled once into a set of normalized tokens"""
+
+    def __init__(self, terms):
+        self.terms = frozenset(
+            ' '.join(singularize(word) for word in re.findall(r"[a-z0-9']+", term.lower()))
+            for term in terms
+        ) - {''}
+
+    @classmethod
+    def from_goal(cls, health_goal):
+        return cls(split_list(health_goal.allergies) + split_list(health_goal.dislikes))
+
+    def __bool__(self):
+        return bool(self.terms)
+
+    def matches(self, tokens):
+        """True when any excluded term is among ``tokens``"""
+        return not self.terms.isdisjoint(tokens)
+
+
+def recipes_for_diet(diet_type, queryset=None):
+    """Restrict recipes to those tagged with ``diet_type``; 'balanced' allows all"""
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    if not diet_type or diet_type == 'balanced':
+        return queryset
+    return queryset.filter(diet_tags__slug=diet_type)
+
+
+def _get_or_create_all(model, field, values, defaults=None):
+    """Return ``{value: pk}`` for ``values``, inserting the missing rows in bulk"""
+    existing = dict(model.objects.filter(**{f'{field}__in': values}).values_list(field, 'pk'))
+    missing = [value for value in values if value not in existing]
+    if missing:
+        model.objects.bulk_create(
+            [model(**{field: value}, **(defaults or {}).get(value, {})) for value in missing],
+            ignore_conflicts=True,
+        )
+        existing.update(model.objects.filter(**{f'{field}__in': missing}).values_list(field, 'pk'))
+    return existing
+
+
+def sync_recipe_index(recipes):
+    """Rebuild the diet-tag and ingredient rows of ``recipes`` from their text fields.
+
+    Ingredient quantities and units are parsed here, once per save, so grocery
+    lists never parse strings.
+
+    Works on any number of recipes with a constant number of queries, so it
+    can follow a bulk import as well as a single save.
+    """
+    recipes = [recipe for recipe in recipes if recipe.pk is not None]
+    if not recipes:
+        return
+
+    tags_by_recipe = {}
+    ingredients_by_recipe = {}
+    tag_names = {}
+    for recipe in recipes:
+        slugs = []
+        for label in split_list(recipe.diet_types):
+            slug = diet_slug(label)
+            if slug and slug not in slugs:
+                slugs.append(slug)
+                tag_names.setdefault(slug, {'name': label.title()})
+        tags_by_recipe[recipe.pk] = slugs
+
+        parsed = {}
+        for item in split_list(recipe.ingredients):
+            quantity, unit, name = parse_ingredient(item)
+            name = normalize_name(name)
+            if name and name not in parsed:
+                parsed[name] = (quantity, unit)
+        ingredients_by_recipe[recipe.pk] = parsed
+
+    with transaction.atomic():
+        tag_ids = _get_or_create_all(DietTag, 'slug', list(tag_names), tag_names)
+        ingredient_names = sorted({name for parsed in ingredients_by_recipe.values() for name in parsed})
+        ingredient_ids = _get_or_create_all(
+            Ingredient, 'name', ingredient_names,
+            {name: {'category': categorize(name)} for name in ingredient_names},
+        )
+
+        recipe_ids = [recipe.pk for recipe in recipes]
+        RecipeDietTag.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeDietTag.objects.bulk_create([
+            RecipeDietTag(recipe_id=recipe_id, diet_tag_id=tag_ids[slug])
+            for recipe_id, slugs in tags_by_recipe.items()
+            for slug in slugs
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_ids[name],
+                position=position, quantity=quantity, unit=unit,
+            )
+            for recipe_id, parsed in ingredients_by_recipe.items()
+            for position, (name, (quantity, unit)) in enumerate(parsed.items())
+        ])
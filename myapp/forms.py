@@ -1,4 +1,5 @@
 from django import forms
+from .catalog import recipes_for_diet
 from .models import HealthGoal, MealPlan, Recipe
 
 
@@ -19,6 +20,14 @@ class HealthGoalForm(forms.ModelForm):
         }),
         required=False
     )
+    # Length of the plan generated with the goal; not stored on the goal
+    weeks = forms.IntegerField(
+        min_value=1,
+        max_value=MealPlan.MAX_WEEKS,
+        initial=1,
+        required=False,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '1', 'max': str(MealPlan.MAX_WEEKS)})
+    )
 
     class Meta:
         model = HealthGoal
@@ -75,3 +84,76 @@ class RecipeForm(forms.ModelForm):
             'prep_time_min': forms.NumberInput(attrs={'class': 'form-control'}),
             'meal_type': forms.Select(attrs={'class': 'form-control'}),
         }
+
+
+class RecipeFilterForm(forms.Form):
+    meal_type = forms.ChoiceField(
+        choices=[('', 'Any meal')] + Recipe._meta.get_field('meal_type').choices,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    diet = forms.SlugField(
+        required=False,
+        widget=forms.HiddenInput()
+    )
+    min_calories = forms.IntegerField(
+        required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Min kcal'})
+    )
+    max_calories = forms.IntegerField(
+        required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Max kcal'})
+    )
+    min_protein = forms.FloatField(
+        required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Min protein (g)'})
+    )
+    max_protein = forms.FloatField(
+        required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Max protein (g)'})
+    )
+    min_carbs = forms.FloatField(
+        required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Min carbs (g)'})
+    )
+    max_carbs = forms.FloatField(
+        required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Max carbs (g)'})
+    )
+    min_fat = forms.FloatField(
+        required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Min fat (g)'})
+    )
+    max_fat = forms.FloatField(
+        required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Max fat (g)'})
+    )
+    max_prep_time = forms.IntegerField(
+        required=False, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Max minutes'})
+    )
+
+    # Form field -> queryset lookup for the numeric range filters
+    RANGE_LOOKUPS = {
+        'min_calories': 'calories__gte',
+        'max_calories': 'calories__lte',
+        'min_protein': 'protein_g__gte',
+        'max_protein': 'protein_g__lte',
+        'min_carbs': 'carbs_g__gte',
+        'max_carbs': 'carbs_g__lte',
+        'min_fat': 'fat_g__gte',
+        'max_fat': 'fat_g__lte',
+        'max_prep_time': 'prep_time_min__lte',
+    }
+
+    def filter(self, queryset):
+        """Apply the cleaned filters to a Recipe queryset"""
+        data = self.cleaned_data
+        if data.get('meal_type'):
+            queryset = queryset.filter(meal_type=data['meal_type'])
+        if data.get('diet'):
+            queryset = recipes_for_diet(data['diet'], queryset)
+        for field, lookup in self.RANGE_LOOKUPS.items():
+            if data.get(field) is not None:
+                queryset = queryset.filter(**{lookup: data[field]})
+        return queryset
@@ -0,0 +1,278 @@
+from collections import Counter, defaultdict
+from fractions import Fraction
+import re
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DailyMeal, GroceryItem, MealPlan, RecipeIngredient
+
+
+# Unit -> (base unit, factor); amounts in compatible units are summed in the base unit
+UNIT_CONVERSIONS = {
+    'g': ('g', 1),
+    'kg': ('g', 1000),
+    'oz': ('g', 28.35),
+    'lb': ('g', 453.6),
+    'ml': ('ml', 1),
+    'l': ('ml', 1000),
+    'cup': ('ml', 240),
+    'tbsp': ('ml', 15),
+    'tsp': ('ml', 5),
+    'piece': ('piece', 1),
+}
+
+UNIT_ALIASES = {
+    'g': 'g', 'gram': 'g', 'grams': 'g', 'gr': 'g',
+    'kg': 'kg', 'kgs': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz',
+    'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'ml': 'ml', 'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'l': 'l', 'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'cup': 'cup', 'cups': 'cup',
+    'tbsp': 'tbsp', 'tablespoon': 'tbsp', 'tablespoons': 'tbsp',
+    'tsp': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'piece': 'piece', 'pieces': 'piece', 'pc': 'piece', 'pcs': 'piece',
+}
+
+# Grocery category of known ingredients and of the words that identify them.
+# Looked up once when an Ingredient row is created, never per request.
+INGREDIENT_CATEGORIES = {
+    'peanut butter': 'pantry',
+    'almond butter': 'pantry',
+    'lemon juice': 'pantry',
+    'soy sauce': 'pantry',
+    'coconut milk': 'pantry',
+    'protein bar': 'pantry',
+    'vegetable': 'produce', 'vegetables': 'produce', 'greens': 'produce', 'fruit': 'produce',
+    'apple': 'produce', 'banana': 'produce', 'berries': 'produce', 'lemon': 'produce',
+    'tomato': 'produce', 'tomatoes': 'produce', 'cucumber': 'produce', 'cucumbers': 'produce',
+    'spinach': 'produce', 'lettuce': 'produce', 'broccoli': 'produce', 'carrot': 'produce',
+    'carrots': 'produce', 'celery': 'produce', 'onion': 'produce', 'garlic': 'produce',
+    'ginger': 'produce', 'peppers': 'produce', 'pepper': 'pantry', 'basil': 'produce',
+    'avocado': 'produce', 'potato': 'produce', 'potatoes': 'produce', 'kale': 'produce',
+    'chicken': 'meat', 'beef': 'meat', 'turkey': 'meat', 'pork': 'meat', 'fish': 'meat',
+    'salmon': 'meat', 'tuna': 'meat', 'shrimp': 'meat',
+    'milk': 'dairy', 'cheese': 'dairy', 'yogurt': 'dairy', 'butter': 'dairy',
+    'eggs': 'dairy', 'egg': 'dairy', 'cream': 'dairy',
+    'rice': 'grains', 'bread': 'grains', 'oats': 'grains', 'quinoa': 'grains',
+    'pasta': 'grains', 'granola': 'grains', 'tortilla': 'grains', 'flour': 'grains',
+    'oil': 'pantry', 'salt': 'pantry', 'honey': 'pantry', 'almonds': 'pantry',
+    'chickpeas': 'pantry', 'hummus': 'pantry', 'tahini': 'pantry', 'mustard': 'pantry',
+    'oregano': 'pantry', 'sauce': 'pantry',
+    'frozen': 'frozen', 'ice': 'frozen',
+    'juice': 'beverages', 'coffee': 'beverages', 'tea': 'beverages', 'water': 'beverages',
+}
+
+_QUANTITY = r'(\d+(?:\.\d+)?(?:/\d+)?)'
+_LEADING = re.compile(rf'^{_QUANTITY}\s*([a-z]+\b)?\s*(.*)$')
+_TRAILING = re.compile(rf'^(.*?)\s+{_QUANTITY}\s*([a-z]+)?$')
+
+
+def _number(text):
+    try:
+        return float(Fraction(text))
+    except ZeroDivisionError:
+        return 1.0
+
+
+def parse_ingredient(text):
+    """Split '200 g chicken breast' into (200.0, 'g', 'chicken breast').
+
+    Also accepts the legacy 'Eggs 2' form and bare names, which count as one
+    piece. Runs when a recipe is saved, not when a grocery list is built.
+    """
+    text = ' '.join(text.lower().split())
+    match = _LEADING.match(text)
+    if match:
+        quantity, unit, name = match.groups()
+        if unit in UNIT_ALIASES:
+            return _number(quantity), UNIT_ALIASES[unit], name.removeprefix('of ').strip()
+        rest = f'{unit} {name}' if unit else name
+        return _number(quantity), 'piece', rest.strip()
+    match = _TRAILING.match(text)
+    if match:
+        name, quantity, unit = match.groups()
+        if unit is None or unit in UNIT_ALIASES:
+            return _number(quantity), UNIT_ALIASES.get(unit, 'piece'), name.strip()
+    return 1.0, 'piece', text
+
+
+def categorize(name):
+    """Grocery category of a normalized ingredient name"""
+    if name in INGREDIENT_CATEGORIES:
+        return INGREDIENT_CATEGORIES[name]
+    for word in reversed(name.split()):
+        if word in INGREDIENT_CATEGORIES:
+            return INGREDIENT_CATEGORIES[word]
+    return 'pantry'
+
+
+def format_quantity(amount, base_unit):
+    """Render a base-unit amount, promoting to kg/l when it gets large"""
+    if base_unit == 'g' and amount >= 1000:
+        amount, base_unit = amount / 1000, 'kg'
+    elif base_unit == 'ml' and amount >= 1000:
+        amount, base_unit = amount / 1000, 'l'
+    amount = round(amount, 2)
+    number = f'{amount:g}'
+    if base_unit == 'piece':
+        return f'{number} piece' if amount == 1 else f'{number} pieces'
+    return f'{number} {base_unit}'
+
+
+def recipe_counts(daily_meals):
+    """Count how many times each recipe is served across the given days"""
+    counts = Counter()
+    for daily_meal in daily_meals:
+        for recipe_id in (daily_meal.breakfast_id, daily_meal.lunch_id, daily_meal.dinner_id, daily_meal.snack_id):
+            if recipe_id is not None:
+                counts[recipe_id] += 1
+    return counts
+
+
+def ingredient_rows(recipe_ids):
+    """Pre-parsed ingredient rows of some recipes, in the shape ``sum_ingredients`` takes"""
+    return list(RecipeIngredient.objects.filter(recipe_id__in=list(recipe_ids)).values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name', 'ingredient__category', 'quantity', 'unit',
+    ))
+
+
+def sum_ingredients(rows, counts, totals=None):
+    """Add ingredient ``rows`` times ``{recipe_id: servings}`` into ``totals`` by base unit.
+
+    ``totals`` is ``{(ingredient_id, base_unit): [name, category, amount, servings]}``.
+    Negative servings give negative sums, so the same call turns a change
+    in servings into a ledger delta.
+    """
+    if totals is None:
+        totals = {}
+    for recipe_id, ingredient_id, name, category, quantity, unit in rows:
+        if not counts.get(recipe_id):
+            continue
+        base_unit, factor = UNIT_CONVERSIONS[unit]
+        key = (ingredient_id, base_unit)
+        if key not in totals:
+            totals[key] = [name, category, 0, 0]
+        totals[key][2] += quantity * factor * counts[recipe_id]
+        totals[key][3] += counts[recipe_id]
+    return totals
+
+
+def aggregate_ingredients(counts):
+    """Sum pre-parsed ingredient amounts of ``{recipe_id: servings}`` from a single query"""
+    return sum_ingredients(ingredient_rows(counts), counts)
+
+
+def build_grocery_items(meal_plan, daily_meals):
+    """Unsaved GroceryItem rows for every ingredient the days call for"""
+    items = []
+    for (ingredient_id, base_unit), (name, category, amount, servings) in aggregate_ingredients(recipe_counts(daily_meals)).items():
+        items.append(GroceryItem(
+            meal_plan=meal_plan,
+            ingredient_id=ingredient_id,
+            base_unit=base_unit,
+            amount=amount,
+            ref_count=servings,
+            name=name[:1].upper() + name[1:],
+            quantity=format_quantity(amount, base_unit),
+            category=category,
+        ))
+    return items
+
+
+def ledger_changes(meal_plan_id, delta):
+    """Grocery items to upsert and delete for an ingredient delta of a plan.
+
+    ``delta`` is shaped like ``sum_ingredients`` totals, with positive
+    amounts and servings for what the plan gained and negative ones for what
+    it lost. Only the ledger rows of the ingredients involved are read.
+    Returns ``(created, updated, deleted)``: unsaved rows for new entries,
+    unsaved rows carrying the new totals of existing entries, and the
+    existing rows whose reference count drops to zero. Rows that stay keep
+    their purchased flag.
+    """
+    # A swap between recipes using different amounts of one ingredient nets
+    # to zero servings but still changes the amount
+    delta = {key: value for key, value in delta.items() if value[3] or abs(value[2]) > 1e-9}
+    existing = {}
+    if delta:
+        rows = GroceryItem.objects.filter(
+            meal_plan_id=meal_plan_id, ingredient_id__in={ingredient_id for ingredient_id, _ in delta},
+        )
+        existing = {(item.ingredient_id, item.base_unit): item for item in rows}
+
+    created, updated, deleted = [], [], []
+    for (ingredient_id, base_unit), (name, category, amount, refs) in delta.items():
+        item = existing.get((ingredient_id, base_unit))
+        if item is not None:
+            amount += item.amount
+            refs += item.ref_count
+            if refs <= 0:
+                deleted.append(item)
+                continue
+            name, category = item.name, item.category
+        elif refs <= 0:
+            continue
+        entry = GroceryItem(
+            meal_plan_id=meal_plan_id,
+            ingredient_id=ingredient_id,
+            base_unit=base_unit,
+            amount=max(amount, 0),
+            ref_count=refs,
+            name=name[:1].upper() + name[1:],
+            quantity=format_quantity(max(amount, 0), base_unit),
+            category=category,
+        )
+        (updated if item is not None else created).append(entry)
+    return created, updated, deleted
+
+
+def apply_ledger_delta(meal_plan_id, delta):
+    """Write an ingredient delta to a plan's grocery ledger.
+
+    One upsert for the new and changed rows and one delete for the rows no
+    recipe needs any more, so writes grow with the edit, not the plan.
+    Returns the ``(created, updated, deleted)`` items of ``ledger_changes``.
+    """
+    created, updated, deleted = ledger_changes(meal_plan_id, delta)
+    GroceryItem.objects.bulk_create(
+        created + updated,
+        update_conflicts=True,
+        unique_fields=['meal_plan', 'ingredient', 'base_unit'],
+        # name, category and purchased are left as they are
+        update_fields=['amount', 'ref_count', 'quantity'],
+    )
+    GroceryItem.objects.filter(pk__in=[item.pk for item in deleted]).delete()
+    return created, updated, deleted
+
+
+def plan_servings(recipe_ids):
+    """``{meal_plan_id: Counter({recipe_id: servings})}`` of the plans serving ``recipe_ids``"""
+    recipe_ids = set(recipe_ids)
+    days = DailyMeal.objects.filter(
+        Q(breakfast__in=recipe_ids) | Q(lunch__in=recipe_ids) | Q(dinner__in=recipe_ids) | Q(snack__in=recipe_ids)
+    ).values_list('meal_plan_id', 'breakfast_id', 'lunch_id', 'dinner_id', 'snack_id')
+    servings = defaultdict(Counter)
+    for meal_plan_id, *slots in days:
+        servings[meal_plan_id].update(recipe_id for recipe_id in slots if recipe_id in recipe_ids)
+    return dict(servings)
+
+
+def refresh_recipe_ledgers(old_rows, servings):
+    """Move plan ledgers from recipes' old ingredient rows to their current ones.
+
+    ``old_rows`` are ``ingredient_rows`` read before the recipes changed (or
+    were deleted) and ``servings`` the ``plan_servings`` read at the same
+    time. Touches every plan whose list changed.
+    """
+    if not servings:
+        return
+    new_rows = ingredient_rows({recipe_id for counts in servings.values() for recipe_id in counts})
+    touched = []
+    for meal_plan_id, counts in servings.items():
+        removed = {recipe_id: -count for recipe_id, count in counts.items()}
+        delta = sum_ingredients(old_rows, removed, sum_ingredients(new_rows, counts))
+        if any(apply_ledger_delta(meal_plan_id, delta)):
+            touched.append(meal_plan_id)
+    MealPlan.objects.filter(pk__in=touched).update(updated_at=timezone.now())
@@ -0,0 +1,25 @@
+"""Entry points for generation worker processes.
+
+This module imports nothing from the app at load time, so a freshly spawned
+process can unpickle these functions before Django has been set up.
+"""
+
+
+def setup():
+    import django
+
+    django.setup()
+
+
+def run(job_id):
+    from django.db import close_old_connections
+
+    from .jobs import run_generation_job
+
+    # Reuse the worker's persistent connection unless it is broken or past
+    # CONN_MAX_AGE, as Django does around each request
+    close_old_connections()
+    try:
+        return job_id, run_generation_job(job_id)
+    finally:
+        close_old_connections()
@@ -0,0 +1,75 @@
+from datetime import timedelta
+import traceback
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import GenerationJob, MealPlan
+from .views import generate_grocery_list, generate_meal_plan, plan_week
+
+# Attempts before a job that keeps hitting database errors is marked failed
+MAX_ATTEMPTS = 3
+
+
+def claim_jobs(limit):
+    """Atomically move up to ``limit`` claimable jobs to running and return their ids.
+
+    Besides queued jobs, running jobs started more than
+    ``GENERATION_JOB_TIMEOUT`` seconds ago are claimed again: their worker
+    died mid-job and its transaction rolled back. Each job is claimed with a
+    conditional UPDATE on the state it was read in, so concurrent workers
+    never run the same job twice.
+    """
+    stale = timezone.now() - timedelta(seconds=getattr(settings, 'GENERATION_JOB_TIMEOUT', 600))
+    candidates = GenerationJob.objects.filter(
+        Q(status='queued') | Q(status='running', started_at__lt=stale)
+    ).order_by('created_at', 'pk')
+    claimed = []
+    for job_id, status, started_at in candidates.values_list('pk', 'status', 'started_at')[:limit]:
+        updated = GenerationJob.objects.filter(pk=job_id, status=status, started_at=started_at).update(
+            status='running', started_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(job_id)
+    return claimed
+
+
+def _fail(job, error=None):
+    GenerationJob.objects.filter(pk=job.pk).update(
+        status='failed', error=error or traceback.format_exc(), finished_at=timezone.now(),
+    )
+    MealPlan.objects.filter(pk=job.meal_plan_id).update(status='failed', updated_at=timezone.now())
+    return 'failed'
+
+
+def run_generation_job(job_id):
+    """Generate the plan of a claimed job and record the outcome"""
+    job = GenerationJob.objects.select_related('meal_plan__health_goal').get(pk=job_id)
+    meal_plan = job.meal_plan
+    if meal_plan.status == 'ready':
+        # A reclaimed job whose worker died after the plan was committed
+        GenerationJob.objects.filter(pk=job_id).update(status='done', finished_at=timezone.now())
+        return 'done'
+    if job.attempts > MAX_ATTEMPTS:
+        # Reclaimed too often; the job itself probably kills its worker
+        return _fail(job, f'Worker stopped during each of {MAX_ATTEMPTS} attempts')
+    try:
+        # Plan first so the write transaction only covers the inserts
+        week = plan_week(meal_plan.health_goal, seed=meal_plan.seed, days=meal_plan.days)
+        with transaction.atomic():
+            daily_meals = generate_meal_plan(meal_plan, meal_plan.health_goal, week=week)
+            generate_grocery_list(meal_plan, daily_meals)
+            MealPlan.objects.filter(pk=meal_plan.pk).update(status='ready', updated_at=timezone.now())
+    except OperationalError:
+        # Usually a transient "database is locked"; put the job back in line
+        if job.attempts < MAX_ATTEMPTS:
+            GenerationJob.objects.filter(pk=job_id).update(status='queued', error=traceback.format_exc())
+            return 'retrying'
+        return _fail(job)
+    except Exception:
+        return _fail(job)
+
+    GenerationJob.objects.filter(pk=job_id).update(status='done', finished_at=timezone.now())
+    return 'done'
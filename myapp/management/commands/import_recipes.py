@@ -0,0 +1,164 @@
+import csv
+import json
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from myapp.cache import bump_catalog_version
+from myapp.catalog import sync_recipe_index
+from myapp.groceries import ingredient_rows, plan_servings, refresh_recipe_ledgers
+from myapp.models import DailyMeal, Recipe
+
+
+IMPORT_FIELDS = [
+    'name', 'description', 'calories', 'protein_g', 'carbs_g', 'fat_g',
+    'prep_time_min', 'ingredients', 'instructions', 'diet_types', 'meal_type',
+]
+
+
+def read_rows(path, fmt):
+    """Yield ``(row_number, dict)`` pairs from a CSV or JSON Lines file, one at a time"""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(handle), start=1):
+                yield number, row
+        else:
+            number = 0
+            for line in handle:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    row = ValueError(f'invalid JSON: {exc}')
+                yield number, row
+
+
+def build_recipe(row):
+    """Validate a raw row against the Recipe fields and return an unsaved Recipe"""
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError('expected an object')
+    values = {}
+    for name in IMPORT_FIELDS:
+        field = Recipe._meta.get_field(name)
+        raw = row.get(name)
+        if isinstance(raw, str):
+            raw = raw.strip()
+        if raw in (None, '') and field.has_default():
+            raw = field.get_default()
+        try:
+            values[name] = field.clean(raw, None)
+        except ValidationError as exc:
+            raise ValueError(f'{name}: {" ".join(exc.messages)}')
+    return Recipe(**values)
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, data):
+    # Write then rename so a crash never leaves a half-written checkpoint
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as handle:
+        json.dump(data, handle)
+    os.replace(temp_path, path)
+
+
+class Command(BaseCommand):
+    help = 'Stream recipes from a CSV or JSON Lines file and upsert them by name in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or a .jsonl file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per upsert transaction')
+        parser.add_argument('--checkpoint',
+                            help='File recording the last committed row, for --resume')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the rows already committed according to --checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No such file: {path}')
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        batch_size = max(1, options['batch_size'])
+        checkpoint = options['checkpoint']
+        if options['resume'] and not checkpoint:
+            raise CommandError('--resume requires --checkpoint')
+
+        skip = 0
+        if options['resume']:
+            state = read_checkpoint(checkpoint)
+            if state and state.get('path') == os.path.abspath(path):
+                skip = state['rows']
+                self.stdout.write(f'Resuming after row {skip}')
+
+        started = time.monotonic()
+        imported = errors = last_row = 0
+        batch = {}
+        for number, row in read_rows(path, fmt):
+            last_row = number
+            if number <= skip:
+                continue
+            try:
+                recipe = build_recipe(row)
+            except ValueError as exc:
+                errors += 1
+                self.stderr.write(f'Row {number}: {exc}')
+                continue
+            # Later rows win when a name repeats inside a batch
+            batch[recipe.name] = recipe
+            if len(batch) >= batch_size:
+                imported += self.flush(batch, number, path, checkpoint, started, imported)
+                batch = {}
+
+        if batch:
+            imported += self.flush(batch, last_row, path, checkpoint, started, imported)
+        elif checkpoint and last_row > skip:
+            write_checkpoint(checkpoint, {'path': os.path.abspath(path), 'rows': last_row})
+
+        elapsed = time.monotonic() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes ({errors} rejected) in {elapsed:.1f}s, {rate:.0f} rows/s'
+        ))
+
+    def flush(self, batch, row_number, path, checkpoint, started, imported):
+        recipes = list(batch.values())
+        with transaction.atomic():
+            # Grocery lists serving recipes this batch overwrites, with the
+            # ingredients they were built from
+            existing = list(Recipe.objects.filter(name__in=batch).values_list('pk', flat=True))
+            servings = plan_servings(existing)
+            old_rows = ingredient_rows(existing) if servings else []
+            Recipe.objects.bulk_create(
+                recipes,
+                update_conflicts=True,
+                unique_fields=['name'],
+                update_fields=[field for field in IMPORT_FIELDS if field != 'name'],
+            )
+            # bulk_create skips post_save, so refresh the indexes it would maintain
+            sync_recipe_index(recipes)
+            DailyMeal.refresh_totals(recipe_ids=[recipe.pk for recipe in recipes])
+            refresh_recipe_ledgers(old_rows, servings)
+            bump_catalog_version()
+        if checkpoint:
+            write_checkpoint(checkpoint, {'path': os.path.abspath(path), 'rows': row_number})
+
+        imported += len(recipes)
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'{imported} recipes imported ({imported / max(elapsed, 1e-6):.0f} rows/s)')
+        return len(recipes)
@@ -0,0 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from myapp import job_worker
+from myapp.jobs import claim_jobs
+
+
+class Command(BaseCommand):
+    help = 'Process queued meal plan generation jobs in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        # Children must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=job_worker.setup) as pool:
+            while True:
+                # Long-running loop: drop the connection once it is broken or stale
+                close_old_connections()
+                job_ids = claim_jobs(workers)
+                if not job_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                for job_id, outcome in pool.map(job_worker.run, job_ids):
+                    style = {'done': self.style.SUCCESS, 'retrying': self.style.WARNING}.get(outcome, self.style.ERROR)
+                    self.stdout.write(style(f'Job {job_id}: {outcome}'))
+
+        self.stdout.write(self.style.SUCCESS('Generation worker stopped'))
@@ -0,0 +1,213 @@
+import heapq
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger('myapp.performance')
+
+# Upper bounds (ms) of the wall-time histogram buckets; the last one is open
+HISTOGRAM_BOUNDS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` that times every statement of one request"""
+
+    def __init__(self, keep=5):
+        self.keep = keep
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            # Min-heap of the ``keep`` slowest statements seen so far
+            entry = (elapsed, self.count, sql)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, entry)
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def slowest_statements(self):
+        return [(sql, elapsed) for elapsed, _, sql in sorted(self.slowest, reverse=True)]
+
+
+class ViewStats:
+    """Running totals and a wall-time histogram of the sampled requests to one view"""
+
+    def __init__(self):
+        self.requests = 0
+        self.wall_time = 0.0
+        self.max_wall_time = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_time = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.slowest = {}
+
+    def add(self, wall_time, recorder, keep):
+        self.requests += 1
+        self.wall_time += wall_time
+        self.max_wall_time = max(self.max_wall_time, wall_time)
+        self.queries += recorder.count
+        self.max_queries = max(self.max_queries, recorder.count)
+        self.sql_time += recorder.duration
+        milliseconds = wall_time * 1000
+        bucket = next(
+            (index for index, bound in enumerate(HISTOGRAM_BOUNDS_MS) if milliseconds <= bound),
+            len(HISTOGRAM_BOUNDS_MS),
+        )
+        self.histogram[bucket] += 1
+        # Keep the slowest run of each distinct statement
+        for sql, elapsed in recorder.slowest_statements():
+            if elapsed > self.slowest.get(sql, 0):
+                self.slowest[sql] = elapsed
+        if len(self.slowest) > keep:
+            self.slowest = dict(sorted(self.slowest.items(), key=lambda item: -item[1])[:keep])
+
+    def as_dict(self):
+        labels = [f'<={bound}ms' for bound in HISTOGRAM_BOUNDS_MS] + [f'>{HISTOGRAM_BOUNDS_MS[-1]}ms']
+        return {
+            'requests': self.requests,
+            'mean_ms': round(self.wall_time / self.requests * 1000, 3),
+            'max_ms': round(self.max_wall_time * 1000, 3),
+            'mean_queries': round(self.queries / self.requests, 2),
+            'max_queries': self.max_queries,
+            'mean_sql_ms': round(self.sql_time / self.requests * 1000, 3),
+            'histogram': dict(zip(labels, self.histogram)),
+            'slowest_statements': [
+                {'sql': sql, 'ms': round(elapsed * 1000, 3)}
+                for sql, elapsed in sorted(self.slowest.items(), key=lambda item: -item[1])
+            ],
+        }
+
+
+class RequestStats:
+    """Per-view statistics of this process, safe to update from several threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, wall_time, recorder, keep=5):
+        with self._lock:
+            if view_name not in self._views:
+                self._views[view_name] = ViewStats()
+            self._views[view_name].add(wall_time, recorder, keep)
+
+    def snapshot(self):
+        """Statistics of every view, hottest (most total wall time) first"""
+        with self._lock:
+            views = sorted(self._views.items(), key=lambda item: -item[1].wall_time)
+            return {name: stats.as_dict() for name, stats in views}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+request_stats = RequestStats()
+
+
+# Resolve ``connection`` inside the calling thread, unlike a bound method
+def _attach(recorder):
+    connection.execute_wrappers.append(recorder)
+
+
+def _detach(recorder):
+    connection.execute_wrappers.remove(recorder)
+
+
+class RequestProfilingMiddleware:
+    """Time every request and record a sample's SQL via ``connection.execute_wrapper``.
+
+    Any request slower than ``REQUEST_PROFILING_SLOW_MS`` is logged to
+    ``myapp.performance``; timing costs two ``perf_counter`` calls.
+    ``REQUEST_PROFILING_SAMPLE_RATE`` is the fraction of requests whose
+    queries are recorded and counted in the statistics; those are also
+    logged when they issue at least ``REQUEST_PROFILING_SLOW_QUERIES``
+    statements. Statistics are kept per process.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sampled():
+            started = time.perf_counter()
+            response = self.get_response(request)
+            self.report(request, time.perf_counter() - started)
+            return response
+
+        recorder = QueryRecorder(getattr(settings, 'REQUEST_PROFILING_SLOWEST_STATEMENTS', 5))
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        self.report(request, time.perf_counter() - started, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            started = time.perf_counter()
+            response = await self.get_response(request)
+            self.report(request, time.perf_counter() - started)
+            return response
+
+        recorder = QueryRecorder(getattr(settings, 'REQUEST_PROFILING_SLOWEST_STATEMENTS', 5))
+        started = time.perf_counter()
+        # The async ORM runs queries in the request's sync thread, so the
+        # wrapper goes on that thread's connection, not the event loop's
+        await sync_to_async(_attach)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(_detach)(recorder)
+        self.report(request, time.perf_counter() - started, recorder)
+        return response
+
+    def sampled(self):
+        sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0)
+        return sample_rate and random.random() < sample_rate
+
+    def report(self, request, wall_time, recorder=None):
+        """Log a slow request; sampled ones (with a ``recorder``) also go into the statistics"""
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else '<unresolved>'
+        slow_ms = getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 500)
+        if recorder is None:
+            if wall_time * 1000 >= slow_ms:
+                logger.warning(
+                    'Slow request %s %s (%s): %.1f ms (queries not sampled)',
+                    request.method, request.path, view_name, wall_time * 1000,
+                )
+            return
+
+        request_stats.record(view_name, wall_time, recorder, recorder.keep)
+        slow_queries = getattr(settings, 'REQUEST_PROFILING_SLOW_QUERIES', 50)
+        if wall_time * 1000 >= slow_ms or recorder.count >= slow_queries:
+            slowest = recorder.slowest_statements()
+            logger.warning(
+                'Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in SQL; slowest: %s',
+                request.method, request.path, view_name, wall_time * 1000,
+                recorder.count, recorder.duration * 1000,
+                f'{slowest[0][1] * 1000:.1f} ms {slowest[0][0][:200]}' if slowest else 'none',
+            )
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+
+def split_list(text):
+    return [part.strip() for part in (text or '').split(',') if part.strip()]
+
+
+def normalize_name(name):
+    return ' '.join(name.lower().split())
+
+
+def populate_recipe_index(apps, schema_editor):
+    Recipe = apps.get_model('myapp', 'Recipe')
+    DietTag = apps.get_model('myapp', 'DietTag')
+    Ingredient = apps.get_model('myapp', 'Ingredient')
+    RecipeDietTag = apps.get_model('myapp', 'RecipeDietTag')
+    RecipeIngredient = apps.get_model('myapp', 'RecipeIngredient')
+
+    tags = {}
+    ingredients = {}
+    recipe_tags = []
+    recipe_ingredients = []
+    for recipe in Recipe.objects.only('pk', 'diet_types', 'ingredients').iterator():
+        seen = set()
+        for label in split_list(recipe.diet_types):
+            slug = '_'.join(normalize_name(label).replace('-', ' ').split())
+            if slug in seen:
+                continue
+            seen.add(slug)
+            if slug not in tags:
+                tags[slug] = DietTag.objects.get_or_create(slug=slug, defaults={'name': label.title()})[0]
+            recipe_tags.append(RecipeDietTag(recipe_id=recipe.pk, diet_tag=tags[slug]))
+
+        seen = set()
+        for position, item in enumerate(split_list(recipe.ingredients)):
+            name = normalize_name(item)
+            if name in seen:
+                continue
+            seen.add(name)
+            if name not in ingredients:
+                ingredients[name] = Ingredient.objects.get_or_create(name=name)[0]
+            recipe_ingredients.append(RecipeIngredient(
+                recipe_id=recipe.pk, ingredient=ingredients[name], position=position
+            ))
+
+    RecipeDietTag.objects.bulk_create(recipe_tags, batch_size=1000)
+    RecipeIngredient.objects.bulk_create(recipe_ingredients, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_recipe_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_recipe_index, migrations.RunPython.noop),
+    ]
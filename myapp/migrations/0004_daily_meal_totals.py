@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+def backfill_totals(apps, schema_editor):
+    DailyMeal = apps.get_model('myapp', 'DailyMeal')
+    meals = list(DailyMeal.objects.select_related('breakfast', 'lunch', 'dinner', 'snack'))
+    for meal in meals:
+        recipes = [r for r in (meal.breakfast, meal.lunch, meal.dinner, meal.snack) if r]
+        meal.total_calories = sum(r.calories for r in recipes)
+        meal.total_protein_g = sum(r.protein_g for r in recipes)
+        meal.total_carbs_g = sum(r.carbs_g for r in recipes)
+        meal.total_fat_g = sum(r.fat_g for r in recipes)
+    DailyMeal.objects.bulk_update(
+        meals, ['total_calories', 'total_protein_g', 'total_carbs_g', 'total_fat_g'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_populate_recipe_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailymeal',
+            name='total_calories',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='dailymeal',
+            name='total_carbs_g',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailymeal',
+            name='total_fat_g',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailymeal',
+            name='total_protein_g',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_daily_meal_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='healthgoal',
+            index=models.Index(fields=['created_at', 'id'], name='myapp_healt_created_6fbbac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mealplan',
+            index=models.Index(fields=['health_goal', 'created_at'], name='myapp_mealp_health__f8eb46_idx'),
+        ),
+    ]
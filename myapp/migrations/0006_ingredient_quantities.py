@@ -0,0 +1,158 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:27
+
+from fractions import Fraction
+import re
+
+from django.db import migrations, models
+
+# Frozen copies of myapp.groceries as of this migration
+UNIT_ALIASES = {
+    'g': 'g', 'gram': 'g', 'grams': 'g', 'gr': 'g',
+    'kg': 'kg', 'kgs': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz',
+    'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'ml': 'ml', 'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'l': 'l', 'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'cup': 'cup', 'cups': 'cup',
+    'tbsp': 'tbsp', 'tablespoon': 'tbsp', 'tablespoons': 'tbsp',
+    'tsp': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'piece': 'piece', 'pieces': 'piece', 'pc': 'piece', 'pcs': 'piece',
+}
+
+INGREDIENT_CATEGORIES = {
+    'peanut butter': 'pantry',
+    'almond butter': 'pantry',
+    'lemon juice': 'pantry',
+    'soy sauce': 'pantry',
+    'coconut milk': 'pantry',
+    'protein bar': 'pantry',
+    'vegetable': 'produce', 'vegetables': 'produce', 'greens': 'produce', 'fruit': 'produce',
+    'apple': 'produce', 'banana': 'produce', 'berries': 'produce', 'lemon': 'produce',
+    'tomato': 'produce', 'tomatoes': 'produce', 'cucumber': 'produce', 'cucumbers': 'produce',
+    'spinach': 'produce', 'lettuce': 'produce', 'broccoli': 'produce', 'carrot': 'produce',
+    'carrots': 'produce', 'celery': 'produce', 'onion': 'produce', 'garlic': 'produce',
+    'ginger': 'produce', 'peppers': 'produce', 'pepper': 'pantry', 'basil': 'produce',
+    'avocado': 'produce', 'potato': 'produce', 'potatoes': 'produce', 'kale': 'produce',
+    'chicken': 'meat', 'beef': 'meat', 'turkey': 'meat', 'pork': 'meat', 'fish': 'meat',
+    'salmon': 'meat', 'tuna': 'meat', 'shrimp': 'meat',
+    'milk': 'dairy', 'cheese': 'dairy', 'yogurt': 'dairy', 'butter': 'dairy',
+    'eggs': 'dairy', 'egg': 'dairy', 'cream': 'dairy',
+    'rice': 'grains', 'bread': 'grains', 'oats': 'grains', 'quinoa': 'grains',
+    'pasta': 'grains', 'granola': 'grains', 'tortilla': 'grains', 'flour': 'grains',
+    'oil': 'pantry', 'salt': 'pantry', 'honey': 'pantry', 'almonds': 'pantry',
+    'chickpeas': 'pantry', 'hummus': 'pantry', 'tahini': 'pantry', 'mustard': 'pantry',
+    'oregano': 'pantry', 'sauce': 'pantry',
+    'frozen': 'frozen', 'ice': 'frozen',
+    'juice': 'beverages', 'coffee': 'beverages', 'tea': 'beverages', 'water': 'beverages',
+}
+
+_QUANTITY = r'(\d+(?:\.\d+)?(?:/\d+)?)'
+_LEADING = re.compile(rf'^{_QUANTITY}\s*([a-z]+\b)?\s*(.*)$')
+_TRAILING = re.compile(rf'^(.*?)\s+{_QUANTITY}\s*([a-z]+)?$')
+
+
+
+def _number(text):
+    try:
+        return float(Fraction(text))
+    except ZeroDivisionError:
+        return 1.0
+
+
+def parse_ingredient(text):
+    text = ' '.join(text.lower().split())
+    match = _LEADING.match(text)
+    if match:
+        quantity, unit, name = match.groups()
+        if unit in UNIT_ALIASES:
+            return _number(quantity), UNIT_ALIASES[unit], name.removeprefix('of ').strip()
+        rest = f'{unit} {name}' if unit else name
+        return _number(quantity), 'piece', rest.strip()
+    match = _TRAILING.match(text)
+    if match:
+        name, quantity, unit = match.groups()
+        if unit is None or unit in UNIT_ALIASES:
+            return _number(quantity), UNIT_ALIASES.get(unit, 'piece'), name.strip()
+    return 1.0, 'piece', text
+
+
+def categorize(name):
+    if name in INGREDIENT_CATEGORIES:
+        return INGREDIENT_CATEGORIES[name]
+    for word in reversed(name.split()):
+        if word in INGREDIENT_CATEGORIES:
+            return INGREDIENT_CATEGORIES[word]
+    return 'pantry'
+
+
+def split_list(text):
+    return [part.strip() for part in (text or '').split(',') if part.strip()]
+
+
+def normalize_name(name):
+    return ' '.join(name.lower().split())
+
+
+def parse_ingredients(apps, schema_editor):
+    """Re-parse the ingredient rows 0003 created from the raw text.
+
+    0003 stored each whole item as an ingredient name, e.g. "200 g chicken"
+    as one piece. Rebuild every recipe's rows from its text with parsed
+    quantities and units, drop the ingredients nothing uses any more and
+    categorize the rest.
+    """
+    Recipe = apps.get_model('myapp', 'Recipe')
+    Ingredient = apps.get_model('myapp', 'Ingredient')
+    RecipeIngredient = apps.get_model('myapp', 'RecipeIngredient')
+
+    ingredients = dict(Ingredient.objects.values_list('name', 'pk'))
+    recipe_ingredients = []
+    for recipe in Recipe.objects.only('pk', 'ingredients').iterator():
+        parsed = {}
+        for item in split_list(recipe.ingredients):
+            quantity, unit, name = parse_ingredient(item)
+            name = normalize_name(name)
+            if name and name not in parsed:
+                parsed[name] = (quantity, unit)
+        for position, (name, (quantity, unit)) in enumerate(parsed.items()):
+            if name not in ingredients:
+                ingredients[name] = Ingredient.objects.create(name=name).pk
+            recipe_ingredients.append(RecipeIngredient(
+                recipe_id=recipe.pk, ingredient_id=ingredients[name],
+                position=position, quantity=quantity, unit=unit,
+            ))
+
+    RecipeIngredient.objects.all().delete()
+    RecipeIngredient.objects.bulk_create(recipe_ingredients, batch_size=1000)
+    Ingredient.objects.filter(recipe_ingredients__isnull=True).delete()
+
+    ingredients = list(Ingredient.objects.all())
+    for ingredient in ingredients:
+        ingredient.category = categorize(ingredient.name)
+    Ingredient.objects.bulk_update(ingredients, ['category'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='category',
+            field=models.CharField(choices=[('produce', 'Produce'), ('dairy', 'Dairy'), ('meat', 'Meat & Fish'), ('grains', 'Grains & Cereals'), ('pantry', 'Pantry'), ('frozen', 'Frozen'), ('beverages', 'Beverages')], default='pantry', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='quantity',
+            field=models.FloatField(default=1),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='unit',
+            field=models.CharField(choices=[('g', 'Grams'), ('kg', 'Kilograms'), ('oz', 'Ounces'), ('lb', 'Pounds'), ('ml', 'Milliliters'), ('l', 'Liters'), ('cup', 'Cups'), ('tbsp', 'Tablespoons'), ('tsp', 'Teaspoons'), ('piece', 'Pieces')], default='piece', max_length=10),
+        ),
+        migrations.RunPython(parse_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+
+# External-content FTS5 index over the searchable Recipe columns. The triggers
+# keep it in step with every write, including bulk_create upserts and raw SQL
+# that bypass model signals.
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE myapp_recipe_fts USING fts5(
+        name, description, ingredients,
+        content='myapp_recipe', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER myapp_recipe_fts_insert AFTER INSERT ON myapp_recipe BEGIN
+        INSERT INTO myapp_recipe_fts(rowid, name, description, ingredients)
+        VALUES (new.id, new.name, new.description, new.ingredients);
+    END
+    """,
+    """
+    CREATE TRIGGER myapp_recipe_fts_delete AFTER DELETE ON myapp_recipe BEGIN
+        INSERT INTO myapp_recipe_fts(myapp_recipe_fts, rowid, name, description, ingredients)
+        VALUES ('delete', old.id, old.name, old.description, old.ingredients);
+    END
+    """,
+    """
+    CREATE TRIGGER myapp_recipe_fts_update AFTER UPDATE OF name, description, ingredients ON myapp_recipe BEGIN
+        INSERT INTO myapp_recipe_fts(myapp_recipe_fts, rowid, name, description, ingredients)
+        VALUES ('delete', old.id, old.name, old.description, old.ingredients);
+        INSERT INTO myapp_recipe_fts(rowid, name, description, ingredients)
+        VALUES (new.id, new.name, new.description, new.ingredients);
+    END
+    """,
+    "INSERT INTO myapp_recipe_fts(myapp_recipe_fts) VALUES ('rebuild')",
+]
+
+REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS myapp_recipe_fts_update',
+    'DROP TRIGGER IF EXISTS myapp_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS myapp_recipe_fts_insert',
+    'DROP TABLE IF EXISTS myapp_recipe_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # Other backends fall back to LIKE lookups in myapp.search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in FORWARD_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_recipe_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
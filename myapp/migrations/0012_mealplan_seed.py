@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealplan',
+            name='seed',
+            field=models.PositiveIntegerField(default=0, help_text='Random seed the week was generated with'),
+        ),
+    ]
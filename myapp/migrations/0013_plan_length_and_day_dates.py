@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_dates(apps, schema_editor):
+    DailyMeal = apps.get_model('myapp', 'DailyMeal')
+    meals = list(DailyMeal.objects.select_related('meal_plan').only('day_number', 'meal_plan__start_date'))
+    for meal in meals:
+        meal.date = meal.meal_plan.start_date + timedelta(days=meal.day_number - 1)
+    DailyMeal.objects.bulk_update(meals, ['date'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_mealplan_seed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealplan',
+            name='days',
+            field=models.PositiveSmallIntegerField(default=7, help_text='Number of days, starting at start_date'),
+        ),
+        migrations.AlterField(
+            model_name='dailymeal',
+            name='day_number',
+            field=models.PositiveSmallIntegerField(),
+        ),
+        migrations.AddField(
+            model_name='dailymeal',
+            name='date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(fill_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dailymeal',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailymeal',
+            unique_together={('meal_plan', 'day_number'), ('meal_plan', 'date')},
+        ),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:51
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copies of myapp.groceries as of this migration
+UNIT_CONVERSIONS = {
+    'g': ('g', 1),
+    'kg': ('g', 1000),
+    'oz': ('g', 28.35),
+    'lb': ('g', 453.6),
+    'ml': ('ml', 1),
+    'l': ('ml', 1000),
+    'cup': ('ml', 240),
+    'tbsp': ('ml', 15),
+    'tsp': ('ml', 5),
+    'piece': ('piece', 1),
+}
+
+
+def format_quantity(amount, base_unit):
+    if base_unit == 'g' and amount >= 1000:
+        amount, base_unit = amount / 1000, 'kg'
+    elif base_unit == 'ml' and amount >= 1000:
+        amount, base_unit = amount / 1000, 'l'
+    amount = round(amount, 2)
+    number = f'{amount:g}'
+    if base_unit == 'piece':
+        return f'{number} piece' if amount == 1 else f'{number} pieces'
+    return f'{number} {base_unit}'
+
+
+def rebuild_ledger(apps, schema_editor):
+    """Rebuild every existing grocery list as ledger rows.
+
+    Earlier lists were written with free-form quantities ("4 units") and one
+    row per occurrence, so they cannot be matched up with ingredient totals.
+    Each plan's list is summed again from its days instead. A rebuilt item is
+    purchased when every old item of the same name was, and keeps the
+    highest old estimated price.
+    """
+    DailyMeal = apps.get_model('myapp', 'DailyMeal')
+    GroceryItem = apps.get_model('myapp', 'GroceryItem')
+    RecipeIngredient = apps.get_model('myapp', 'RecipeIngredient')
+
+    plan_ids = list(GroceryItem.objects.values_list('meal_plan_id', flat=True).distinct())
+    for plan_id in plan_ids:
+        old = {}
+        for name, purchased, price in GroceryItem.objects.filter(meal_plan_id=plan_id).values_list(
+            'name', 'purchased', 'estimated_price',
+        ):
+            was_purchased, best_price = old.get(name.lower(), (True, 0))
+            old[name.lower()] = (was_purchased and purchased, max(best_price, price))
+
+        counts = Counter()
+        for row in DailyMeal.objects.filter(meal_plan_id=plan_id).values_list('breakfast_id', 'lunch_id', 'dinner_id', 'snack_id'):
+            counts.update(recipe_id for recipe_id in row if recipe_id is not None)
+        totals = {}
+        rows = RecipeIngredient.objects.filter(recipe_id__in=list(counts)).values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name', 'ingredient__category', 'quantity', 'unit',
+        )
+        for recipe_id, ingredient_id, name, category, quantity, unit in rows:
+            base_unit, factor = UNIT_CONVERSIONS[unit]
+            entry = totals.setdefault((ingredient_id, base_unit), [name, category, 0, 0])
+            entry[2] += quantity * factor * counts[recipe_id]
+            entry[3] += counts[recipe_id]
+
+        items = []
+        for (ingredient_id, base_unit), (name, category, amount, refs) in totals.items():
+            purchased, price = old.get(name, (False, 0))
+            items.append(GroceryItem(
+                meal_plan_id=plan_id,
+                ingredient_id=ingredient_id,
+                base_unit=base_unit,
+                amount=amount,
+                ref_count=refs,
+                name=name[:1].upper() + name[1:],
+                quantity=format_quantity(amount, base_unit),
+                category=category,
+                purchased=purchased,
+                estimated_price=price,
+            ))
+        GroceryItem.objects.filter(meal_plan_id=plan_id).delete()
+        GroceryItem.objects.bulk_create(items, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_plan_length_and_day_dates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groceryitem',
+            name='amount',
+            field=models.FloatField(default=0, help_text='Total in base_unit'),
+        ),
+        migrations.AddField(
+            model_name='groceryitem',
+            name='base_unit',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='groceryitem',
+            name='ingredient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='grocery_items', to='myapp.ingredient'),
+        ),
+        migrations.AddField(
+            model_name='groceryitem',
+            name='ref_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(rebuild_ledger, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='groceryitem',
+            unique_together={('meal_plan', 'ingredient', 'base_unit')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_grocery_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groceryitem',
+            index=models.Index(fields=['meal_plan', 'category', 'name'], name='myapp_groce_meal_pl_c0e914_idx'),
+        ),
+    ]
@@ -1,4 +1,17 @@
 from django.db import models
+from django.utils import timezone
+
+
+GROCERY_CATEGORY_CHOICES = [
+    ('produce', 'Produce'),
+    ('dairy', 'Dairy'),
+    ('meat', 'Meat & Fish'),
+    ('grains', 'Grains & Cereals'),
+    ('pantry', 'Pantry'),
+    ('frozen', 'Frozen'),
+    ('beverages', 'Beverages'),
+]
+
 
 class HealthGoal(models.Model):
     GOAL_CHOICES = [
@@ -33,10 +46,11 @@ class HealthGoal(models.Model):
 
     class Meta:
         verbose_name_plural = "Health Goals"
+        indexes = [models.Index(fields=['created_at', 'id'])]
 
 
 class Recipe(models.Model):
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, unique=True)
     description = models.TextField()
     calories = models.IntegerField()
     protein_g = models.FloatField(default=0)  # grams
@@ -59,79 +73,230 @@ class Recipe(models.Model):
             ('snack', 'Snack'),
         ]
     )
+    # Indexed copies of diet_types and ingredients, kept in sync on save
+    diet_tags = models.ManyToManyField(
+        'DietTag', through='RecipeDietTag', related_name='recipes', blank=True
+    )
+    ingredient_items = models.ManyToManyField(
+        'Ingredient', through='RecipeIngredient', related_name='recipes', blank=True
+    )
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['meal_type', 'name']
+        indexes = [
+            models.Index(fields=['meal_type', 'name']),
+            models.Index(fields=['meal_type', 'calories']),
+        ]
+
+
+class DietTag(models.Model):
+    slug = models.SlugField(max_length=50, unique=True, help_text="Matches HealthGoal diet_type values")
+    name = models.CharField(max_length=50)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+
+class Ingredient(models.Model):
+    name = models.CharField(max_length=200, unique=True, help_text="Normalized lowercase name")
+    category = models.CharField(max_length=50, choices=GROCERY_CATEGORY_CHOICES, default='pantry')
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+
+class RecipeDietTag(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recipe_diet_tags')
+    diet_tag = models.ForeignKey(DietTag, on_delete=models.CASCADE, related_name='recipe_diet_tags')
+
+    class Meta:
+        unique_together = ('recipe', 'diet_tag')
+        indexes = [models.Index(fields=['diet_tag', 'recipe'])]
+
+
+class RecipeIngredient(models.Model):
+    UNIT_CHOICES = [
+        ('g', 'Grams'),
+        ('kg', 'Kilograms'),
+        ('oz', 'Ounces'),
+        ('lb', 'Pounds'),
+        ('ml', 'Milliliters'),
+        ('l', 'Liters'),
+        ('cup', 'Cups'),
+        ('tbsp', 'Tablespoons'),
+        ('tsp', 'Teaspoons'),
+        ('piece', 'Pieces'),
+    ]
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recipe_ingredients')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='recipe_ingredients')
+    position = models.PositiveSmallIntegerField(default=0)
+    quantity = models.FloatField(default=1)
+    unit = models.CharField(max_length=10, choices=UNIT_CHOICES, default='piece')
+
+    class Meta:
+        ordering = ['recipe', 'position']
+        unique_together = ('recipe', 'ingredient')
+        indexes = [models.Index(fields=['ingredient', 'recipe'])]
 
 
 class MealPlan(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    # Plans share a seed unless told otherwise, so identical goal profiles
+    # get the same (memoized) week
+    DEFAULT_SEED = 0
+
+    # Plan lengths offered, in weeks
+    MAX_WEEKS = 12
+
     health_goal = models.ForeignKey(HealthGoal, on_delete=models.CASCADE)
     start_date = models.DateField()
+    seed = models.PositiveIntegerField(default=DEFAULT_SEED, help_text="Random seed the week was generated with")
+    days = models.PositiveSmallIntegerField(default=7, help_text="Number of days, starting at start_date")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ready')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the plan, its days or its grocery list change; the
+    # plan pages derive their ETags from it
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Meal Plan for {self.health_goal.user_name} - {self.start_date}"
 
+    @classmethod
+    def touch(cls, pk):
+        """Mark a plan as changed without loading it"""
+        cls.objects.filter(pk=pk).update(updated_at=timezone.now())
+
     class Meta:
         ordering = ['-start_date']
+        indexes = [models.Index(fields=['health_goal', 'created_at'])]
 
 
 class DailyMeal(models.Model):
     meal_plan = models.ForeignKey(MealPlan, on_delete=models.CASCADE, related_name='meals')
-    day_number = models.IntegerField(choices=[(i, f"Day {i}") for i in range(1, 8)])
+    # 1-based position in the plan; ``date`` is start_date + day_number - 1
+    day_number = models.PositiveSmallIntegerField()
+    date = models.DateField()
     breakfast = models.ForeignKey(Recipe, on_delete=models.SET_NULL, null=True, blank=True, related_name='breakfast_meals')
     lunch = models.ForeignKey(Recipe, on_delete=models.SET_NULL, null=True, blank=True, related_name='lunch_meals')
     dinner = models.ForeignKey(Recipe, on_delete=models.SET_NULL, null=True, blank=True, related_name='dinner_meals')
     snack = models.ForeignKey(Recipe, on_delete=models.SET_NULL, null=True, blank=True, related_name='snack_meals')
+    # Stored sums of the four recipes, refreshed by compute_totals()
+    total_calories = models.IntegerField(default=0, db_index=True)
+    total_protein_g = models.FloatField(default=0)
+    total_carbs_g = models.FloatField(default=0)
+    total_fat_g = models.FloatField(default=0)
 
     def __str__(self):
         return f"Day {self.day_number} - {self.meal_plan.health_goal.user_name}"
 
     class Meta:
         ordering = ['meal_plan', 'day_number']
-        unique_together = ('meal_plan', 'day_number')
+        unique_together = [('meal_plan', 'day_number'), ('meal_plan', 'date')]
 
-    def get_total_calories(self):
-        total = 0
+    def compute_totals(self):
+        """Recompute the stored totals from the four recipe slots"""
+        self.total_calories = 0
+        self.total_protein_g = self.total_carbs_g = self.total_fat_g = 0
         for meal in [self.breakfast, self.lunch, self.dinner, self.snack]:
             if meal:
-                total += meal.calories
-        return total
+                self.total_calories += meal.calories
+                self.total_protein_g += meal.protein_g
+                self.total_carbs_g += meal.carbs_g
+                self.total_fat_g += meal.fat_g
+
+    @classmethod
+    def refresh_totals(cls, recipe_ids=None, meal_ids=None):
+        """Recompute and save the totals of the days using the given recipes or ids"""
+        meals = cls.objects.select_related('breakfast', 'lunch', 'dinner', 'snack')
+        if recipe_ids is not None:
+            meals = meals.filter(
+                models.Q(breakfast__in=recipe_ids) | models.Q(lunch__in=recipe_ids)
+                | models.Q(dinner__in=recipe_ids) | models.Q(snack__in=recipe_ids)
+            )
+        if meal_ids is not None:
+            meals = meals.filter(pk__in=meal_ids)
+        meals = list(meals)
+        for meal in meals:
+            meal.compute_totals()
+        cls.objects.bulk_update(
+            meals, ['total_calories', 'total_protein_g', 'total_carbs_g', 'total_fat_g'], batch_size=500
+        )
+        return len(meals)
+
+    def get_total_calories(self):
+        return self.total_calories
 
     def get_total_nutrition(self):
-        nutrition = {'protein': 0, 'carbs': 0, 'fat': 0}
-        for meal in [self.breakfast, self.lunch, self.dinner, self.snack]:
-            if meal:
-                nutrition['protein'] += meal.protein_g
-                nutrition['carbs'] += meal.carbs_g
-                nutrition['fat'] += meal.fat_g
-        return nutrition
+        return {
+            'protein': self.total_protein_g,
+            'carbs': self.total_carbs_g,
+            'fat': self.total_fat_g,
+        }
 
 
 class GroceryItem(models.Model):
     meal_plan = models.ForeignKey(MealPlan, on_delete=models.CASCADE, related_name='grocery_items')
     name = models.CharField(max_length=200)
     quantity = models.CharField(max_length=100, help_text="e.g., 2 kg, 1 bunch, 1 liter")
-    category = models.CharField(
-        max_length=50,
-        choices=[
-            ('produce', 'Produce'),
-            ('dairy', 'Dairy'),
-            ('meat', 'Meat & Fish'),
-            ('grains', 'Grains & Cereals'),
-            ('pantry', 'Pantry'),
-            ('frozen', 'Frozen'),
-            ('beverages', 'Beverages'),
-        ]
-    )
+    category = models.CharField(max_length=50, choices=GROCERY_CATEGORY_CHOICES)
     estimated_price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     purchased = models.BooleanField(default=False)
+    # Ledger of one ingredient in one base unit over the plan: the summed
+    # amount and how many recipe servings call for it. Plan edits apply
+    # deltas; the row goes away when ref_count reaches zero.
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.SET_NULL, null=True, blank=True, related_name='grocery_items'
+    )
+    base_unit = models.CharField(max_length=10, blank=True)
+    amount = models.FloatField(default=0, help_text="Total in base_unit")
+    ref_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['category', 'name']
+        unique_together = ('meal_plan', 'ingredient', 'base_unit')
+        # A plan's list in Meta.ordering order, straight off the index
+        indexes = [models.Index(fields=['meal_plan', 'category', 'name'])]
+
+
+class GenerationJob(models.Model):
+    """Queued request to generate a meal plan's days and grocery list"""
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    meal_plan = models.ForeignKey(MealPlan, on_delete=models.CASCADE, related_name='generation_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Generation job {self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
@@ -0,0 +1,103 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _field_name(term):
+    return term.lstrip('-')
+
+
+def _model_field(model, name):
+    return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(model, ordering, cursor):
+    """Turn a cursor back into typed values, or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            return None
+        return [
+            _model_field(model, _field_name(term)).to_python(value)
+            for term, value in zip(ordering, values)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def keyset_filter(ordering, values):
+    """Q selecting rows strictly after ``values`` in ``ordering``"""
+    condition = Q()
+    for index, term in enumerate(ordering):
+        lookup = 'lt' if term.startswith('-') else 'gt'
+        clause = Q(**{f'{_field_name(term)}__{lookup}': values[index]})
+        for previous, value in zip(ordering[:index], values[:index]):
+            clause &= Q(**{_field_name(previous): value})
+        condition |= clause
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=20):
+    """Return the page after ``cursor`` without OFFSET.
+
+    ``ordering`` must end in a unique field (usually ``pk``) so every row has
+    a distinct position; deep pages then cost the same indexed seek as the
+    first one. Malformed cursors fall back to the first page. ``values()``
+    querysets work too, as long as they select every ordering field.
+    """
+    queryset = _after_cursor(queryset, ordering, cursor)
+    return _page(list(queryset[:page_size + 1]), ordering, page_size)
+
+
+async def akeyset_page(queryset, ordering, cursor=None, page_size=20):
+    """``keyset_page`` for async views"""
+    queryset = _after_cursor(queryset, ordering, cursor)
+    return _page([item async for item in queryset[:page_size + 1]], ordering, page_size)
+
+
+def _after_cursor(queryset, ordering, cursor):
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(queryset.model, ordering, cursor)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+    return queryset
+
+
+def _page(items, ordering, page_size):
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        if isinstance(last, dict):
+            values = [last[_field_name(term)] for term in ordering]
+        else:
+            values = [getattr(last, _field_name(term)) for term in ordering]
+        next_cursor = encode_cursor(values)
+    return KeysetPage(items, next_cursor)
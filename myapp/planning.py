@@ -0,0 +1,457 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+import hashlib
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .cache import Uncached, cached_catalog, catalog_version
+from .catalog import name_tokens, recipes_for_diet
+from .models import Recipe, RecipeIngredient
+
+
+MEAL_SLOTS = ['breakfast', 'lunch', 'dinner', 'snack']
+
+# Recipe columns a pool keeps in memory; the large text fields are deferred
+POOL_FIELDS = ['name', 'meal_type', 'calories', 'protein_g', 'carbs_g', 'fat_g', 'prep_time_min']
+
+# Share of the daily calorie target that each slot should cover
+SLOT_CALORIE_SHARES = {
+    'breakfast': 0.25,
+    'lunch': 0.35,
+    'dinner': 0.30,
+    'snack': 0.10,
+}
+
+# Share of daily calories coming from (protein, carbs, fat) for each goal
+GOAL_MACRO_SPLITS = {
+    'weight_loss': (0.35, 0.35, 0.30),
+    'muscle_gain': (0.30, 0.45, 0.25),
+    'maintenance': (0.25, 0.50, 0.25),
+    'energy': (0.20, 0.55, 0.25),
+    'general_health': (0.25, 0.50, 0.25),
+}
+
+CALORIES_PER_GRAM = {'protein': 4, 'carbs': 4, 'fat': 9}
+
+
+class PlanTargets:
+    """Daily calorie and macro targets a plan is scored against"""
+
+    def __init__(self, calories, protein_g, carbs_g, fat_g):
+        self.calories = calories
+        self.protein_g = protein_g
+        self.carbs_g = carbs_g
+        self.fat_g = fat_g
+
+    @classmethod
+    def from_goal(cls, health_goal):
+        calories = health_goal.daily_calories if health_goal.daily_calories > 0 else 2000
+        protein, carbs, fat = GOAL_MACRO_SPLITS.get(
+            health_goal.goal, GOAL_MACRO_SPLITS['maintenance']
+        )
+        return cls(
+            calories=calories,
+            protein_g=calories * protein / CALORIES_PER_GRAM['protein'],
+            carbs_g=calories * carbs / CALORIES_PER_GRAM['carbs'],
+            fat_g=calories * fat / CALORIES_PER_GRAM['fat'],
+        )
+
+    def slot_calories(self, slot):
+        return self.calories * SLOT_CALORIE_SHARES[slot]
+
+
+class RecipePool:
+    """Recipe catalog loaded once, bucketed by meal type and sorted by calories.
+
+    ``tokens`` optionally maps recipe pk to the set of its ingredient tokens
+    (see ``catalog.name_tokens``) so exclusions can be applied in memory.
+    """
+
+    def __init__(self, recipes, tokens=None):
+        self.tokens = tokens or {}
+        buckets = defaultdict(list)
+        for recipe in recipes:
+            buckets[recipe.meal_type].append(recipe)
+
+        self.buckets = {}
+        self.calories = {}
+        self.by_pk = {}
+        for meal_type, bucket in buckets.items():
+            self.by_pk.update((recipe.pk, recipe) for recipe in bucket)
+            bucket.sort(key=lambda recipe: (recipe.calories, recipe.pk))
+            self.buckets[meal_type] = bucket
+            self.calories[meal_type] = [recipe.calories for recipe in bucket]
+
+    @classmethod
+    def load(cls, queryset=None, with_ingredients=False):
+        """Build a pool from a single read of the recipe catalog.
+
+        ``with_ingredients`` adds one query for the ingredient names and
+        precomputes every recipe's token set.
+        """
+        if queryset is None:
+            queryset = Recipe.objects.all()
+        queryset = queryset.order_by().only(*POOL_FIELDS)
+        tokens = None
+        if with_ingredients:
+            tokens = defaultdict(set)
+            names = RecipeIngredient.objects.filter(
+                recipe__in=queryset.values('pk')
+            ).values_list('recipe_id', 'ingredient__name')
+            for recipe_id, name in names:
+                tokens[recipe_id] |= name_tokens(name)
+        return cls(queryset, tokens)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def recipes(self):
+        for bucket in self.buckets.values():
+            yield from bucket
+
+    def without(self, matcher):
+        """Return a new pool without the recipes whose ingredients match ``matcher``"""
+        if not matcher:
+            return self
+        empty = frozenset()
+        return RecipePool(
+            (recipe for recipe in self.recipes()
+             if not matcher.matches(self.tokens.get(recipe.pk, empty))),
+            self.tokens,
+        )
+
+    def window(self, meal_type, low, high):
+        """Return the recipes of a meal type with calories in [low, high]"""
+        bucket = self.buckets.get(meal_type, [])
+        calories = self.calories.get(meal_type, [])
+        return bucket[bisect_left(calories, low):bisect_right(calories, high)]
+
+    def nearest(self, meal_type, target_calories, count):
+        """Return up to ``count`` recipes of a meal type closest to the target calories"""
+        bucket = self.buckets.get(meal_type, [])
+        calories = self.calories.get(meal_type, [])
+        low = high = bisect_left(calories, target_calories)
+        while high - low < count and (low > 0 or high < len(bucket)):
+            if low == 0:
+                high += 1
+            elif high == len(bucket):
+                low -= 1
+            elif target_calories - calories[low - 1] <= calories[high] - target_calories:
+                low -= 1
+            else:
+                high += 1
+        return bucket[low:high]
+
+    def pick(self, meal_type, target_calories, rng, tolerance=0.2):
+        """Pick a random recipe within ``tolerance`` of the target calories.
+
+        Falls back to any recipe of the meal type when nothing lands in the
+        window, and returns None when the meal type has no recipes at all.
+        """
+        candidates = self.window(
+            meal_type,
+            target_calories * (1 - tolerance),
+            target_calories * (1 + tolerance),
+        )
+        if not candidates:
+            candidates = self.buckets.get(meal_type)
+        if not candidates:
+            return None
+        return candidates[rng.randrange(len(candidates))]
+
+
+def day_deviation(recipes, targets, macro_weight=1.0):
+    """Squared relative deviation of a day's recipes from the daily targets"""
+    calories = protein = carbs = fat = 0
+    for recipe in recipes:
+        if recipe is not None:
+            calories += recipe.calories
+            protein += recipe.protein_g
+            carbs += recipe.carbs_g
+            fat += recipe.fat_g
+    return totals_deviation(calories, protein, carbs, fat, targets, macro_weight)
+
+
+def totals_deviation(calories, protein, carbs, fat, targets, macro_weight=1.0):
+    """Squared relative deviation of a day's summed nutrition from the daily targets"""
+    score = ((calories - targets.calories) / targets.calories) ** 2
+    for actual, target in ((protein, targets.protein_g), (carbs, targets.carbs_g), (fat, targets.fat_g)):
+        if target:
+            score += macro_weight * ((actual - target) / target) ** 2
+    return score
+
+
+def slot_deviation(recipe, targets, slot, macro_weight=1.0):
+    """Squared relative deviation of one recipe from a slot's share of the targets"""
+    share = SLOT_CALORIE_SHARES[slot]
+    score = ((recipe.calories - targets.calories * share) / (targets.calories * share)) ** 2
+    for actual, target in ((recipe.protein_g, targets.protein_g), (recipe.carbs_g, targets.carbs_g),
+                           (recipe.fat_g, targets.fat_g)):
+        if target:
+            score += macro_weight * ((actual - target * share) / (target * share)) ** 2
+    return score
+
+
+class PlanningEngine:
+    """Strategy that fills every slot of every day from a recipe pool.
+
+    Subclasses implement ``plan`` and return a list of ``{slot: recipe}``
+    dicts, one per day. ``time_budget`` is in seconds; engines must return
+    their best plan so far once it is spent, and set ``timed_out``. A plan
+    cut short by the clock depends on the machine's load rather than on the
+    seed, so callers must not memoize it.
+    """
+
+    def __init__(self, time_budget=None):
+        if time_budget is None:
+            time_budget = getattr(settings, 'MEAL_PLAN_TIME_BUDGET', 0.5)
+        self.time_budget = time_budget
+        self.timed_out = False
+
+    def plan(self, pool, targets, days, rng):
+        raise NotImplementedError
+
+    def replan(self, pool, targets, day, slots, rng, uses):
+        """Re-pick ``slots`` of one ``{slot: recipe}`` day in place.
+
+        The other slots are kept. Each re-picked slot gets a recipe other than
+        its current one whenever the pool has one. ``uses`` counts recipe pks
+        over the rest of the plan, for engines that care about variety.
+        """
+        raise NotImplementedError
+
+
+class RandomEngine(PlanningEngine):
+    """Random pick per slot within 20% of the slot's calorie share"""
+
+    def plan(self, pool, targets, days, rng):
+        return [
+            {slot: pool.pick(slot, targets.slot_calories(slot), rng) for slot in MEAL_SLOTS}
+            for _ in range(days)
+        ]
+
+    def replan(self, pool, targets, day, slots, rng, uses):
+        for slot in slots:
+            current = day[slot]
+            target = targets.slot_calories(slot)
+            candidates = [recipe for recipe in pool.window(slot, target * 0.8, target * 1.2) if recipe is not current]
+            if not candidates:
+                candidates = [recipe for recipe in pool.buckets.get(slot, []) if recipe is not current]
+            if candidates:
+                day[slot] = candidates[rng.randrange(len(candidates))]
+        return day
+
+
+class OptimizingEngine(PlanningEngine):
+    """Local search that minimizes calorie and macro deviation per day.
+
+    Each slot draws ``candidates_per_slot`` recipes per week of the plan (up
+    to ``max_candidates_per_slot``) from a window ``window_factor`` times as
+    wide around its calorie share: the half that best fits the slot's share
+    of the macros, plus a random sample of the rest. The cost of a pass is
+    independent of catalog size, and longer plans get more recipes to vary.
+    Repeating a recipe within the plan costs ``variety_penalty`` per extra use.
+
+    The search stops after at most ``max_passes`` passes and
+    ``max_evaluations`` candidate scores, so a seed always gives the same
+    plan; the time budget only aborts it on an overloaded machine.
+    """
+
+    candidates_per_slot = 16
+    max_candidates_per_slot = 96
+    window_factor = 4
+    variety_penalty = 0.02
+    macro_weight = 0.5
+    max_passes = 20
+    max_evaluations = 100_000
+
+    def plan(self, pool, targets, days, rng):
+        deadline = time.monotonic() + self.time_budget
+
+        candidates = {}
+        for slot in MEAL_SLOTS:
+            candidates[slot] = self._candidates(pool, targets, slot, days, rng) or [None]
+
+        week = [
+            {slot: rng.choice(candidates[slot]) for slot in MEAL_SLOTS}
+            for _ in range(days)
+        ]
+        uses = Counter(recipe.pk for day in week for recipe in day.values() if recipe is not None)
+
+        self.timed_out = False
+        passes = self._passes(days * sum(len(candidates[slot]) for slot in MEAL_SLOTS))
+        improved = True
+        while improved and passes:
+            passes -= 1
+            improved = False
+            for day in week:
+                for slot in MEAL_SLOTS:
+                    if self._improve_slot(day, slot, candidates[slot], targets, uses, rng):
+                        improved = True
+                if time.monotonic() >= deadline:
+                    self.timed_out = True
+                    return week
+        return week
+
+    def replan(self, pool, targets, day, slots, rng, uses):
+        deadline = time.monotonic() + self.time_budget
+        uses = Counter(uses)
+
+        # ``uses`` covers the whole plan except the slots being re-picked
+        days = -(-(sum(uses.values()) + len(slots)) // len(MEAL_SLOTS))
+
+        # Leave each slot's current recipe out so the edit always changes it
+        candidates = {}
+        for slot in slots:
+            candidates[slot] = self._candidates(pool, targets, slot, days, rng, exclude=day[slot])
+        slots = [slot for slot in slots if candidates[slot]]
+        for slot in slots:
+            day[slot] = rng.choice(candidates[slot])
+            uses[day[slot].pk] += 1
+
+        self.timed_out = False
+        passes = self._passes(sum(len(candidates[slot]) for slot in slots))
+        improved = True
+        while improved and passes:
+            if time.monotonic() >= deadline:
+                self.timed_out = True
+                break
+            passes -= 1
+            improved = False
+            for slot in slots:
+                if self._improve_slot(day, slot, candidates[slot], targets, uses, rng):
+                    improved = True
+        return day
+
+    def _passes(self, evaluations_per_pass):
+        """Passes a search may make, fixed by its size rather than by the clock"""
+        return max(1, min(self.max_passes, self.max_evaluations // max(evaluations_per_pass, 1)))
+
+    def _candidates(self, pool, targets, slot, days, rng, exclude=None):
+        """Recipes a slot may take in a ``days``-day plan, best macro fit first"""
+        size = min(self.candidates_per_slot * -(-days // 7), self.max_candidates_per_slot)
+        window = [
+            recipe for recipe in pool.nearest(slot, targets.slot_calories(slot), size * self.window_factor + 1)
+            if recipe is not exclude
+        ]
+        window.sort(key=lambda recipe: (slot_deviation(recipe, targets, slot, self.macro_weight), recipe.pk))
+        best, rest = window[:size // 2], window[size // 2:]
+        return best + rng.sample(rest, min(size - len(best), len(rest)))
+
+    def _improve_slot(self, day, slot, candidates, targets, uses, rng):
+        current = day[slot]
+        if current is not None:
+            uses[current.pk] -= 1
+
+        # Sum the other slots once; each candidate then only adds its own numbers
+        calories = protein = carbs = fat = 0
+        for other in MEAL_SLOTS:
+            recipe = day[other]
+            if other != slot and recipe is not None:
+                calories += recipe.calories
+                protein += recipe.protein_g
+                carbs += recipe.carbs_g
+                fat += recipe.fat_g
+
+        best, best_score = current, None
+        for candidate in rng.sample(candidates, len(candidates)):
+            if candidate is None:
+                score = totals_deviation(calories, protein, carbs, fat, targets, self.macro_weight)
+            else:
+                score = totals_deviation(
+                    calories + candidate.calories, protein + candidate.protein_g,
+                    carbs + candidate.carbs_g, fat + candidate.fat_g, targets, self.macro_weight,
+                ) + self.variety_penalty * uses[candidate.pk]
+            if best_score is None or score < best_score - 1e-9 or (
+                candidate is current and score <= best_score + 1e-9
+            ):
+                best, best_score = candidate, score
+
+        day[slot] = best
+        if best is not None:
+            uses[best.pk] += 1
+        return best is not current
+
+
+# Per-process pools by (catalog version, diet), kept apart from the catalog
+# LRU so detail pages, list pages and weeks never evict them
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def recipe_pool(diet_type):
+    """Pool of the recipes allowed by a diet, with ingredient tokens.
+
+    Built once per process and catalog version, so plan generation does not
+    read the catalog at all while it is unchanged.
+    """
+    version = catalog_version()
+    pool = _pools.get((version, diet_type))
+    if pool is None:
+        pool = RecipePool.load(recipes_for_diet(diet_type), with_ingredients=True)
+        with _pools_lock:
+            for key in [key for key in _pools if key[0] != version]:
+                del _pools[key]
+            _pools[version, diet_type] = pool
+    return pool
+
+
+def get_engine(time_budget=None):
+    """Instantiate the engine configured by ``MEAL_PLAN_ENGINE``"""
+    path = getattr(settings, 'MEAL_PLAN_ENGINE', 'myapp.planning.OptimizingEngine')
+    return import_string(path)(time_budget=time_budget)
+
+
+def build_week(pool, targets, seed=None, days=7, engine=None):
+    """Select recipes for every slot of every day from an in-memory pool.
+
+    Returns a list of ``{slot: recipe}`` dicts, one per day.
+    """
+    if engine is None:
+        engine = get_engine()
+    return engine.plan(pool, targets, days, random.Random(seed))
+
+
+def profile_key(health_goal, exclusions, seed, days=7):
+    """Canonical hash of everything besides the catalog that determines a week.
+
+    Goals with the same target, diet, calories and exclusion terms (in any
+    order or spelling ``ExclusionMatcher`` normalizes away) share a key.
+    """
+    profile = {
+        'goal': health_goal.goal,
+        'diet_type': health_goal.diet_type,
+        'daily_calories': health_goal.daily_calories,
+        'exclusions': sorted(exclusions.terms),
+        'seed': seed,
+        'days': days,
+        'engine': getattr(settings, 'MEAL_PLAN_ENGINE', 'myapp.planning.OptimizingEngine'),
+    }
+    return hashlib.sha256(json.dumps(profile, sort_keys=True).encode()).hexdigest()
+
+
+def memoized_week(pool, targets, key, seed, days=7):
+    """``build_week`` memoized as a recipe-id matrix under ``key``.
+
+    The matrix lives in the shared catalog cache, so every process reuses it
+    until the catalog version changes; the recipes come back from ``pool``.
+    """
+    def build():
+        engine = get_engine()
+        week = build_week(pool, targets, seed=seed, days=days, engine=engine)
+        matrix = [
+            {slot: recipe.pk if recipe is not None else None for slot, recipe in day.items()}
+            for day in week
+        ]
+        # A search the clock cut short is not the seed's plan; don't share it
+        return Uncached(matrix) if engine.timed_out else matrix
+
+    return [
+        {slot: pool.by_pk.get(pk) for slot, pk in day.items()}
+        for day in cached_catalog(f'week:{key}', build)
+    ]
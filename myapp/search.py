@@ -0,0 +1,90 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+
+SEARCH_FIELDS = ['name', 'description', 'ingredients']
+
+# bm25 weight of each column of myapp_recipe_fts, in SEARCH_FIELDS order
+SEARCH_WEIGHTS = (10.0, 1.0, 4.0)
+
+_TERM = re.compile(r'\w+\*?')
+
+
+def search_terms(text):
+    """Split user input into words, keeping a trailing '*' as a prefix marker"""
+    return _TERM.findall((text or '').lower())
+
+
+def fts_query(terms):
+    """FTS5 MATCH expression requiring every term, quoted so input is never parsed as syntax"""
+    parts = []
+    for term in terms:
+        if term.endswith('*'):
+            parts.append(f'"{term[:-1]}"*')
+        else:
+            parts.append(f'"{term}"')
+    return ' '.join(parts)
+
+
+def has_fts():
+    return connection.vendor == 'sqlite'
+
+
+def _like_filter(terms):
+    condition = Q()
+    for term in terms:
+        word = term.rstrip('*')
+        any_field = Q()
+        for field in SEARCH_FIELDS:
+            any_field |= Q(**{f'{field}__icontains': word})
+        condition &= any_field
+    return condition
+
+
+def matching_recipes(text, queryset=None):
+    """Filter ``queryset`` to the recipes matching every search term, unranked"""
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+    if not has_fts():
+        return queryset.filter(_like_filter(terms))
+    return queryset.filter(pk__in=RawSQL(
+        'SELECT rowid FROM myapp_recipe_fts WHERE myapp_recipe_fts MATCH %s', (fts_query(terms),)
+    ))
+
+
+def search_recipe_ids(text, limit=50):
+    """Primary keys of the best ``limit`` matches, best first.
+
+    Uses the FTS5 index and its bm25 ranking on SQLite; elsewhere falls back
+    to unranked LIKE lookups.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return []
+    if not has_fts():
+        return list(Recipe.objects.filter(_like_filter(terms)).values_list('pk', flat=True)[:limit])
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM myapp_recipe_fts WHERE myapp_recipe_fts MATCH %s '
+            f'ORDER BY bm25(myapp_recipe_fts, {weights}) LIMIT %s',
+            [fts_query(terms), limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_recipes(text, queryset=None, limit=50):
+    """Ranked list of the recipes matching ``text``"""
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    ids = search_recipe_ids(text, limit)
+    recipes = queryset.in_bulk(ids)
+    return [recipes[pk] for pk in ids if pk in recipes]
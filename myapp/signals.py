@@ -0,0 +1,81 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.db.models import Q
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .catalog import sync_recipe_index
+from .groceries import ingredient_rows, plan_servings, refresh_recipe_ledgers
+from .models import DailyMeal, Recipe
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_ingredients(sender, instance, raw=False, **kwargs):
+    # sync_recipe_index replaces the parsed rows, so note what plans counted
+    if raw or instance.pk is None:
+        return
+    remember_servings(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, raw=False, **kwargs):
+    """Keep the diet-tag and ingredient tables in step with the text fields"""
+    if raw:
+        return
+    sync_recipe_index([instance])
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_daily_totals(sender, instance, created=False, raw=False, **kwargs):
+    """Recompute the stored totals of every day that serves this recipe"""
+    if raw or created:
+        return
+    DailyMeal.refresh_totals(recipe_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_grocery_ledgers(sender, instance, raw=False, **kwargs):
+    """Move the grocery lists serving this recipe to its new ingredients"""
+    if raw:
+        return
+    apply_remembered_servings(instance)
+
+
+def remember_servings(instance):
+    instance._plan_servings = plan_servings([instance.pk])
+    instance._ingredient_rows = ingredient_rows([instance.pk]) if instance._plan_servings else []
+
+
+def apply_remembered_servings(instance):
+    servings = getattr(instance, '_plan_servings', None)
+    if servings:
+        refresh_recipe_ledgers(instance._ingredient_rows, servings)
+    instance._plan_servings = instance._ingredient_rows = None
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_daily_meals(sender, instance, **kwargs):
+    # The slots are nulled by SET_NULL before post_delete, so note the days now
+    instance._daily_meal_ids = list(
+        DailyMeal.objects.filter(
+            Q(breakfast=instance) | Q(lunch=instance) | Q(dinner=instance) | Q(snack=instance)
+        ).values_list('pk', flat=True)
+    )
+    remember_servings(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def refresh_daily_totals_after_delete(sender, instance, **kwargs):
+    meal_ids = getattr(instance, '_daily_meal_ids', None)
+    if meal_ids:
+        DailyMeal.refresh_totals(meal_ids=meal_ids)
+    # The recipe's rows are gone too, so the ledgers only lose what it counted
+    apply_remembered_servings(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_catalog(sender, raw=False, **kwargs):
+    """Drop cached catalog reads in every worker"""
+    if raw:
+        return
+    bump_catalog_version()
@@ -1,3 +1,1165 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import tempfile
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import api
+from .catalog import ExclusionMatcher, name_tokens, recipes_for_diet
+from .cache import bump_catalog_version, cached_catalog, catalog_version, local_cache
+from .groceries import build_grocery_items, format_quantity, parse_ingredient
+from .jobs import MAX_ATTEMPTS, claim_jobs, run_generation_job
+from .middleware import request_stats
+from .models import HealthGoal, Recipe, DietTag, Ingredient, MealPlan, DailyMeal, GroceryItem, GenerationJob
+from .planning import (
+    OptimizingEngine, PlanTargets, RandomEngine, RecipePool, build_week, day_deviation, memoized_week, profile_key,
+    recipe_pool,
+)
+from .search import search_recipe_ids, search_recipes
+from .views import generate_grocery_list, generate_meal_plan, plan_week, replan_day, solve_day, update_grocery_list
+
+
+def make_recipe(name, meal_type, calories, **kwargs):
+    defaults = {
+        'description': f'{name} description',
+        'protein_g': 10,
+        'carbs_g': 20,
+        'fat_g': 5,
+        'ingredients': 'Oats, milk',
+        'instructions': 'Cook it',
+        'diet_types': 'vegetarian',
+    }
+    defaults.update(kwargs)
+    return Recipe.objects.create(name=name, meal_type=meal_type, calories=calories, **defaults)
+
+
+def make_catalog():
+    for meal_type, base in [('breakfast', 150), ('lunch', 200), ('dinner', 200), ('snack', 30)]:
+        for i in range(5):
+            make_recipe(f'{meal_type} {i}', meal_type, base + i * 40)
+
+
+def make_goal(**kwargs):
+    defaults = {
+        'user_name': 'Sam',
+        'goal': 'maintenance',
+        'diet_type': 'balanced',
+        'daily_calories': 2000,
+    }
+    defaults.update(kwargs)
+    return HealthGoal.objects.create(**defaults)
+
+
+# Each test gets empty in-memory caches instead of the shared file cache
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in ('default', 'catalog-version', 'fragments')
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CacheIsolatedTestCase(TestCase):
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        local_cache.clear()
+
+
+class RecipePoolTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog()
+
+    def test_load_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            pool = RecipePool.load()
+        self.assertEqual(len(pool), 20)
+
+    def test_pick_stays_in_calorie_window(self):
+        pool = RecipePool.load()
+        rng = random.Random(1)
+        for _ in range(50):
+            recipe = pool.pick('lunch', 300, rng)
+            self.assertTrue(240 <= recipe.calories <= 360)
+
+    def test_pick_falls_back_to_whole_bucket(self):
+        pool = RecipePool.load()
+        recipe = pool.pick('snack', 5000, random.Random(1))
+        self.assertEqual(recipe.meal_type, 'snack')
+        self.assertIsNone(pool.pick('brunch', 300, random.Random(1)))
+
+    def test_nearest_returns_closest_calories(self):
+        pool = RecipePool.load()
+        nearest = pool.nearest('lunch', 290, 2)
+        self.assertEqual(sorted(recipe.calories for recipe in nearest), [280, 320])
+        self.assertEqual(len(pool.nearest('lunch', 0, 10)), 5)
+
+    def test_same_seed_gives_same_week(self):
+        goal = make_goal()
+        first = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        second = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        generate_meal_plan(first, goal, seed=42)
+        generate_meal_plan(second, goal, seed=42)
+        slots = ('day_number', 'breakfast', 'lunch', 'dinner', 'snack')
+        self.assertEqual(
+            list(DailyMeal.objects.filter(meal_plan=first).values_list(*slots)),
+            list(DailyMeal.objects.filter(meal_plan=second).values_list(*slots)),
+        )
+
+
+class RecipeIndexTests(CacheIsolatedTestCase):
+    def test_save_syncs_diet_tags_and_ingredients(self):
+        recipe = make_recipe('Salad', 'lunch', 300, diet_types='Vegan, gluten-free', ingredients='Kale,  Olive Oil, kale')
+        self.assertEqual(sorted(recipe.diet_tags.values_list('slug', flat=True)), ['gluten_free', 'vegan'])
+        self.assertEqual(list(recipe.ingredient_items.order_by('recipe_ingredients__position').values_list('name', flat=True)), ['kale', 'olive oil'])
+
+        recipe.diet_types = 'keto'
+        recipe.save()
+        self.assertEqual(list(recipe.diet_tags.values_list('slug', flat=True)), ['keto'])
+        self.assertEqual(DietTag.objects.count(), 3)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_diet_filter_uses_tags(self):
+        vegan = make_recipe('Tofu', 'dinner', 400, diet_types='vegan, vegetarian')
+        make_recipe('Steak', 'dinner', 600, diet_types='keto')
+        self.assertEqual(list(recipes_for_diet('vegan')), [vegan])
+        self.assertEqual(recipes_for_diet('balanced').count(), 2)
+
+    def test_plan_only_uses_recipes_for_the_diet(self):
+        make_catalog()
+        vegan = [make_recipe(f'Vegan {slot}', slot, 300, diet_types='vegan') for slot in ('breakfast', 'lunch', 'dinner', 'snack')]
+        goal = make_goal(diet_type='vegan')
+        meal_plan = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        generate_meal_plan(meal_plan, goal, seed=1)
+        used = set()
+        for day in meal_plan.meals.all():
+            used.update([day.breakfast_id, day.lunch_id, day.dinner_id, day.snack_id])
+        self.assertEqual(used, {recipe.pk for recipe in vegan})
+
+
+class ExclusionMatcherTests(CacheIsolatedTestCase):
+    def test_terms_match_whole_words_and_plurals(self):
+        matcher = ExclusionMatcher(['Berry', ' peanut ', 'egg'])
+        self.assertTrue(matcher.matches(name_tokens('mixed berries')))
+        self.assertTrue(matcher.matches(name_tokens('peanut butter')))
+        self.assertTrue(matcher.matches(name_tokens('Eggs')))
+        self.assertFalse(matcher.matches(name_tokens('eggplant')))
+        self.assertFalse(ExclusionMatcher(['', ' ']))
+
+    def test_plan_skips_allergens_and_dislikes(self):
+        make_catalog()
+        for slot in ('breakfast', 'lunch', 'dinner', 'snack'):
+            make_recipe(f'Safe {slot}', slot, 300, ingredients='Rice, spinach')
+        goal = make_goal(allergies='oats', dislikes='Whole milk, milk')
+        meal_plan = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        with self.assertNumQueries(3):
+            generate_meal_plan(meal_plan, goal, seed=1)
+        for day in meal_plan.meals.select_related('breakfast', 'lunch', 'dinner', 'snack'):
+            for recipe in (day.breakfast, day.lunch, day.dinner, day.snack):
+                self.assertTrue(recipe.name.startswith('Safe'))
+
+
+class GroceryAggregationTests(CacheIsolatedTestCase):
+    def test_parse_ingredient(self):
+        self.assertEqual(parse_ingredient('200 g Chicken breast'), (200, 'g', 'chicken breast'))
+        self.assertEqual(parse_ingredient('1/2 cup of milk'), (0.5, 'cup', 'milk'))
+        self.assertEqual(parse_ingredient('3 eggs'), (3, 'piece', 'eggs'))
+        self.assertEqual(parse_ingredient('Eggs 2'), (2, 'piece', 'eggs'))
+        self.assertEqual(parse_ingredient('Olive oil'), (1, 'piece', 'olive oil'))
+
+    def test_format_quantity(self):
+        self.assertEqual(format_quantity(1500, 'g'), '1.5 kg')
+        self.assertEqual(format_quantity(480, 'ml'), '480 ml')
+        self.assertEqual(format_quantity(1, 'piece'), '1 piece')
+
+    def test_sums_compatible_units_across_the_week(self):
+        oats = make_recipe('Porridge', 'breakfast', 300, ingredients='80 g oats, 1 cup milk')
+        shake = make_recipe('Shake', 'snack', 200, ingredients='250 ml milk, 1 banana')
+        goal = make_goal()
+        meal_plan = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        days = DailyMeal.objects.bulk_create([
+            DailyMeal(meal_plan=meal_plan, day_number=day, date=date.today() + timedelta(days=day), breakfast=oats, snack=shake)
+            for day in range(1, 5)
+        ])
+        with self.assertNumQueries(2):
+            generate_grocery_list(meal_plan, days)
+        items = {item.name: (item.quantity, item.category) for item in meal_plan.grocery_items.all()}
+        self.assertEqual(items, {
+            'Oats': ('320 g', 'grains'),
+            'Milk': ('1.96 l', 'dairy'),
+            'Banana': ('4 pieces', 'produce'),
+        })
+
+
+class PlanMemoizationTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog()
+
+    def plan(self, goal, seed=None):
+        return [{slot: recipe.pk for slot, recipe in day.items()} for day in plan_week(goal, seed=seed)]
+
+    def test_identical_profiles_reuse_the_week(self):
+        first = self.plan(make_goal(user_name='Ann', allergies='Peanut', dislikes='shrimp'))
+        other = make_goal(user_name='Bob', allergies='shrimp, peanuts')
+        with mock.patch('myapp.planning.build_week') as build_week, self.assertNumQueries(0):
+            second = self.plan(other)
+        build_week.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_seed_and_profile_are_part_of_the_key(self):
+        goal = make_goal()
+        exclusions = ExclusionMatcher.from_goal(goal)
+        self.assertEqual(profile_key(goal, exclusions, 0), profile_key(make_goal(user_name='Ann'), exclusions, 0))
+        self.assertNotEqual(profile_key(goal, exclusions, 0), profile_key(goal, exclusions, 1))
+        self.assertNotEqual(profile_key(goal, exclusions, 0), profile_key(make_goal(daily_calories=2100), exclusions, 0))
+
+    def test_catalog_change_recomputes(self):
+        goal = make_goal()
+        self.plan(goal)
+        make_recipe('New Lunch', 'lunch', 700)
+        with mock.patch('myapp.planning.build_week', wraps=build_week) as spy:
+            self.plan(goal)
+        spy.assert_called_once()
+
+    def test_pools_are_not_evicted_by_other_catalog_entries(self):
+        pool = recipe_pool('balanced')
+        for number in range(local_cache.maxsize + 1):
+            cached_catalog(f'filler:{number}', lambda: number, shared=False)
+        with self.assertNumQueries(0):
+            self.assertIs(recipe_pool('balanced'), pool)
+
+        make_recipe('New Lunch', 'lunch', 700)
+        self.assertIsNot(recipe_pool('balanced'), pool)
+
+
+class CreateHealthGoalTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog()
+
+    def test_plan_generation_uses_fixed_query_count(self):
+        data = {
+            'user_name': 'Sam',
+            'goal': 'maintenance',
+            'diet_type': 'balanced',
+            'daily_calories': 2000,
+        }
+        # savepoint, goal, plan, recipe pool, pool ingredients, days, grocery
+        # ingredients, grocery items, release
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('myapp:create_health_goal'), data)
+        # The pool is cached for the catalog version after the first plan
+        with self.assertNumQueries(7):
+            self.client.post(reverse('myapp:create_health_goal'), data)
+        meal_plan = MealPlan.objects.earliest('pk')
+        self.assertRedirects(
+            response,
+            reverse('myapp:view_meal_plan', args=[meal_plan.pk]),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(meal_plan.meals.count(), 7)
+        self.assertTrue(GroceryItem.objects.filter(meal_plan=meal_plan).exists())
+
+
+class PlanningEngineTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog()
+        self.pool = RecipePool.load()
+        self.targets = PlanTargets.from_goal(make_goal(goal='muscle_gain', daily_calories=1000))
+
+    def week_deviation(self, week):
+        return sum(day_deviation(day.values(), self.targets) for day in week)
+
+    def test_targets_follow_goal_macro_split(self):
+        self.assertEqual(self.targets.calories, 1000)
+        self.assertAlmostEqual(self.targets.protein_g, 75)
+        self.assertAlmostEqual(self.targets.fat_g, 250 / 9)
+
+    def test_optimizing_engine_beats_random_picks(self):
+        optimized = build_week(self.pool, self.targets, seed=3, engine=OptimizingEngine(time_budget=1))
+        random_week = build_week(self.pool, self.targets, seed=3, engine=RandomEngine(time_budget=1))
+        self.assertLess(self.week_deviation(optimized), self.week_deviation(random_week))
+
+    def test_candidates_grow_with_plan_length_and_favor_macro_fit(self):
+        # Every fourth lunch matches the lunch share of the macros; the rest are all carbs
+        lunch = {'protein_g': self.targets.protein_g * 0.35, 'carbs_g': self.targets.carbs_g * 0.35,
+                 'fat_g': self.targets.fat_g * 0.35}
+        recipes = [
+            Recipe(pk=i, name=f'Lunch {i}', meal_type='lunch', calories=250 + i // 4,
+                   **(lunch if i % 4 == 0 else {'protein_g': 2, 'carbs_g': 80, 'fat_g': 1}))
+            for i in range(1, 401)
+        ]
+        pool = RecipePool(recipes)
+        engine = OptimizingEngine()
+        rng = random.Random(0)
+
+        week = engine._candidates(pool, self.targets, 'lunch', 7, rng)
+        self.assertEqual(len(week), 16)
+        self.assertTrue(all(recipe.pk % 4 == 0 for recipe in week[:8]))
+        self.assertEqual(len(engine._candidates(pool, self.targets, 'lunch', 84, rng)), 96)
+        self.assertNotIn(week[0], engine._candidates(pool, self.targets, 'lunch', 7, rng, exclude=week[0]))
+
+    def test_same_seed_gives_the_same_twelve_week_plan(self):
+        recipes = [
+            Recipe(pk=meal_number * 1000 + i, name=f'{meal_type} {i}', meal_type=meal_type,
+                   calories=base + i * 2, protein_g=5 + i % 17, carbs_g=10 + i % 23, fat_g=2 + i % 11)
+            for meal_number, (meal_type, base) in enumerate([('breakfast', 150), ('lunch', 200), ('dinner', 200), ('snack', 30)])
+            for i in range(300)
+        ]
+        pool = RecipePool(recipes)
+        weeks = []
+        for _ in range(2):
+            engine = OptimizingEngine()
+            week = build_week(pool, self.targets, seed=1, days=84, engine=engine)
+            self.assertFalse(engine.timed_out)
+            weeks.append([{slot: recipe.pk for slot, recipe in day.items()} for day in week])
+        self.assertEqual(weeks[0], weeks[1])
+
+    def test_plans_cut_short_by_the_clock_are_not_memoized(self):
+        goal = make_goal()
+        pool = RecipePool.load()
+        targets = PlanTargets.from_goal(goal)
+        key = profile_key(goal, ExclusionMatcher.from_goal(goal), 5)
+        with override_settings(MEAL_PLAN_TIME_BUDGET=0):
+            memoized_week(pool, targets, key, 5)
+        with mock.patch('myapp.planning.build_week', wraps=build_week) as build:
+            memoized_week(pool, targets, key, 5)
+            memoized_week(pool, targets, key, 5)
+        self.assertEqual(build.call_count, 1)
+
+    def test_exhausted_time_budget_still_fills_every_slot(self):
+        week = build_week(self.pool, self.targets, seed=3, engine=OptimizingEngine(time_budget=0))
+        self.assertEqual(len(week), 7)
+        self.assertTrue(all(recipe is not None for day in week for recipe in day.values()))
+
+
+@override_settings(MEAL_PLAN_ASYNC=True)
+class GenerationJobTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog()
+
+    def queue_plan(self):
+        self.client.post(reverse('myapp:create_health_goal'), {
+            'user_name': 'Sam',
+            'goal': 'maintenance',
+            'diet_type': 'balanced',
+            'daily_calories': 2000,
+        })
+        return MealPlan.objects.latest('pk')
+
+    def test_async_mode_queues_a_job(self):
+        meal_plan = self.queue_plan()
+        self.assertEqual(meal_plan.status, 'pending')
+        self.assertFalse(meal_plan.meals.exists())
+
+        response = self.client.get(reverse('myapp:view_meal_plan', args=[meal_plan.pk]))
+        self.assertTemplateUsed(response, 'myapp/meal_plan_pending.html')
+
+        job_ids = claim_jobs(5)
+        self.assertEqual(claim_jobs(5), [])
+        self.assertEqual(run_generation_job(job_ids[0]), 'done')
+        meal_plan.refresh_from_db()
+        self.assertEqual(meal_plan.status, 'ready')
+        self.assertEqual(meal_plan.meals.count(), 7)
+        self.assertEqual(GenerationJob.objects.get().status, 'done')
+
+    def test_locked_database_retries_then_fails(self):
+        meal_plan = self.queue_plan()
+        locked = mock.patch('myapp.jobs.generate_meal_plan', side_effect=OperationalError('database is locked'))
+        with locked:
+            for _ in range(MAX_ATTEMPTS - 1):
+                job_ids = claim_jobs(5)
+                self.assertEqual(run_generation_job(job_ids[0]), 'retrying')
+                self.assertEqual(GenerationJob.objects.get().status, 'queued')
+            job_ids = claim_jobs(5)
+            self.assertEqual(run_generation_job(job_ids[0]), 'failed')
+
+        job = GenerationJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ('failed', MAX_ATTEMPTS))
+        self.assertIn('database is locked', job.error)
+        meal_plan.refresh_from_db()
+        self.assertEqual(meal_plan.status, 'failed')
+        self.assertFalse(meal_plan.meals.exists())
+
+    def test_other_errors_fail_at_once(self):
+        meal_plan = self.queue_plan()
+        with mock.patch('myapp.jobs.generate_meal_plan', side_effect=ValueError('no recipes')):
+            self.assertEqual(run_generation_job(claim_jobs(5)[0]), 'failed')
+        self.assertEqual(GenerationJob.objects.get().attempts, 1)
+        self.assertEqual(MealPlan.objects.get(pk=meal_plan.pk).status, 'failed')
+
+    @override_settings(GENERATION_JOB_TIMEOUT=60)
+    def test_jobs_of_dead_workers_are_reclaimed(self):
+        meal_plan = self.queue_plan()
+        job_ids = claim_jobs(5)
+        # Still within the timeout, so the job is left to its worker
+        self.assertEqual(claim_jobs(5), [])
+
+        GenerationJob.objects.update(started_at=F('started_at') - timedelta(minutes=5))
+        self.assertEqual(claim_jobs(5), job_ids)
+        self.assertEqual(claim_jobs(5), [])
+        self.assertEqual(run_generation_job(job_ids[0]), 'done')
+        self.assertEqual(MealPlan.objects.get(pk=meal_plan.pk).status, 'ready')
+
+        # A job that keeps killing its worker is eventually given up on
+        meal_plan = self.queue_plan()
+        job = GenerationJob.objects.get(meal_plan=meal_plan)
+        GenerationJob.objects.filter(pk=job.pk).update(
+            status='running', attempts=MAX_ATTEMPTS, started_at=F('created_at') - timedelta(minutes=5),
+        )
+        self.assertEqual(claim_jobs(5), [job.pk])
+        self.assertEqual(run_generation_job(job.pk), 'failed')
+        self.assertEqual(MealPlan.objects.get(pk=meal_plan.pk).status, 'failed')
+
+
+class ViewMealPlanTests(CacheIsolatedTestCase):
+    def test_page_uses_constant_query_count(self):
+        make_catalog()
+        goal = make_goal()
+        meal_plan = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        generate_meal_plan(meal_plan, goal, seed=1)
+        # etag lookup, plan with goal, days with recipes
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('myapp:view_meal_plan', args=[meal_plan.pk]))
+        self.assertEqual(response.status_code, 200)
+        day = response.context['daily_meals'][0]
+        self.assertContains(response, f'{day.get_total_calories()} kcal')
+
+    def test_day_cards_are_cached_per_catalog_version(self):
+        make_catalog()
+        goal = make_goal()
+        meal_plan = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        day = generate_meal_plan(meal_plan, goal, seed=1)[0]
+        url = reverse('myapp:view_meal_plan', args=[meal_plan.pk])
+        self.client.get(url)
+
+        # A queryset update skips the signals, so the cached card is served...
+        Recipe.objects.filter(pk=day.lunch_id).update(name='Renamed Lunch')
+        MealPlan.touch(meal_plan.pk)
+        self.assertNotContains(self.client.get(url), 'Renamed Lunch')
+        # ...until the catalog version moves on
+        bump_catalog_version()
+        self.assertContains(self.client.get(url), 'Renamed Lunch')
+
+
+class ConditionalGetTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog()
+        goal = make_goal()
+        self.meal_plan = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        generate_grocery_list(self.meal_plan, generate_meal_plan(self.meal_plan, goal, seed=1))
+
+    def test_unchanged_grocery_list_returns_304_after_one_query(self):
+        url = reverse('myapp:view_grocery_list', args=[self.meal_plan.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        item = self.meal_plan.grocery_items.first()
+        self.client.post(reverse('myapp:mark_grocery_purchased', args=[item.pk]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_meal_plan_etag_changes_with_catalog(self):
+        url = reverse('myapp:view_meal_plan', args=[self.meal_plan.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        recipe = Recipe.objects.first()
+        recipe.name = 'Renamed'
+        recipe.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_recipe_pages_revalidate_without_queries(self):
+        url = reverse('myapp:recipe_detail', args=[Recipe.objects.first().pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_plan_is_404(self):
+        response = self.client.get(reverse('myapp:view_meal_plan', args=[self.meal_plan.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+class GroceryListViewTests(CacheIsolatedTestCase):
+    def test_subtotals_split_purchased_and_remaining_spend(self):
+        goal = make_goal()
+        meal_plan = MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        GroceryItem.objects.bulk_create([
+            GroceryItem(meal_plan=meal_plan, name='Rice', quantity='1 kg', category='grains', estimated_price='2.50'),
+            GroceryItem(meal_plan=meal_plan, name='Apple', quantity='3 pieces', category='produce',
+                        estimated_price='1.20', purchased=True),
+            GroceryItem(meal_plan=meal_plan, name='Oats', quantity='500 g', category='grains',
+                        estimated_price='3.00', purchased=True),
+            GroceryItem(meal_plan=meal_plan, name='Salt', quantity='1 piece', category='pantry'),
+        ])
+
+        # ETag, plan, subtotals, items
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('myapp:view_grocery_list', args=[meal_plan.pk]))
+        categories = response.context['categories']
+        self.assertEqual(
+            [(row['name'], [item.name for item in row['items']]) for row in categories],
+            [('Grains & Cereals', ['Oats', 'Rice']), ('Pantry', ['Salt']), ('Produce', ['Apple'])],
+        )
+        self.assertEqual(
+            [(row['total'], row['purchased'], row['remaining']) for row in categories],
+            [(Decimal('5.50'), Decimal('3.00'), Decimal('2.50')), (0, 0, 0),
+             (Decimal('1.20'), Decimal('1.20'), 0)],
+        )
+        self.assertEqual(
+            (response.context['total_price'], response.context['purchased_price'], response.context['remaining_price']),
+            (Decimal('6.70'), Decimal('4.20'), Decimal('2.50')),
+        )
+        self.assertContains(response, '$2.50 of $5.50 left')
+
+
+class DailyMealTotalsTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog()
+        self.goal = make_goal()
+        self.meal_plan = MealPlan.objects.create(health_goal=self.goal, start_date=date.today())
+        generate_meal_plan(self.meal_plan, self.goal, seed=1)
+
+    def test_totals_are_stored_at_generation(self):
+        day = self.meal_plan.meals.select_related('breakfast', 'lunch', 'dinner', 'snack').first()
+        recipes = [day.breakfast, day.lunch, day.dinner, day.snack]
+        self.assertEqual(day.total_calories, sum(recipe.calories for recipe in recipes))
+        self.assertEqual(day.total_protein_g, sum(recipe.protein_g for recipe in recipes))
+
+    def test_recipe_edit_and_delete_refresh_totals(self):
+        day = self.meal_plan.meals.first()
+        lunch = day.lunch
+        before = day.total_calories
+        lunch.calories += 100
+        lunch.save()
+        day.refresh_from_db()
+        self.assertEqual(day.total_calories, before + 100)
+
+        lunch.delete()
+        day.refresh_from_db()
+        self.assertIsNone(day.lunch_id)
+        self.assertEqual(day.total_calories, before - (lunch.calories - 100))
+
+
+class DashboardTests(CacheIsolatedTestCase):
+    def test_query_count_does_not_grow_with_goals(self):
+        make_catalog()
+        for i in range(30):
+            goal = make_goal(user_name=f'User {i}')
+            if i % 2:
+                MealPlan.objects.create(health_goal=goal, start_date=date.today())
+        # aggregate counts, one page of goals with their latest plan id
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('myapp:dashboard'))
+        self.assertEqual(response.context['goal_count'], 30)
+        self.assertEqual(response.context['plan_count'], 15)
+
+        page = response.context['health_goals']
+        self.assertEqual(len(page), 24)
+        self.assertEqual(page.items[0].user_name, 'User 29')
+        self.assertIsNotNone(page.items[0].latest_plan_id)
+        self.assertIsNone(page.items[1].latest_plan_id)
+
+        response = self.client.get(reverse('myapp:dashboard'), {'cursor': page.next_cursor})
+        names = [goal.user_name for goal in response.context['health_goals']]
+        self.assertEqual(names, [f'User {i}' for i in range(5, -1, -1)])
+        self.assertFalse(response.context['health_goals'].has_next)
+
+
+class RecipeListTests(CacheIsolatedTestCase):
+    def test_filters_by_nutrition_ranges(self):
+        make_recipe('Light Salad', 'lunch', 300, protein_g=20, fat_g=5, prep_time_min=10)
+        make_recipe('Heavy Stew', 'dinner', 900, protein_g=40, fat_g=30, prep_time_min=60)
+        make_recipe('Sweet Bowl', 'lunch', 350, protein_g=5, fat_g=8, prep_time_min=5)
+        url = reverse('myapp:recipe_list')
+
+        response = self.client.get(url, {'max_calories': 500, 'min_protein': 10})
+        self.assertEqual([recipe.name for recipe in response.context['recipes']], ['Light Salad'])
+        response = self.client.get(url, {'meal_type': 'lunch', 'max_prep_time': 5})
+        self.assertEqual([recipe.name for recipe in response.context['recipes']], ['Sweet Bowl'])
+        response = self.client.get(url, {'max_protein': 30, 'min_fat': 6})
+        self.assertEqual([recipe.name for recipe in response.context['recipes']], ['Sweet Bowl'])
+        response = self.client.get(url, {'min_carbs': 20, 'max_carbs': 20, 'min_protein': 30})
+        self.assertEqual([recipe.name for recipe in response.context['recipes']], ['Heavy Stew'])
+
+        # Invalid input is reported and the filters are ignored
+        response = self.client.get(url, {'max_fat': 'lots'})
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(len(response.context['recipes']), 3)
+
+    def test_pages_keep_filters_and_do_not_overlap(self):
+        for i in range(30):
+            make_recipe(f'Lunch {i:02}', 'lunch', 400)
+        make_recipe('Breakfast', 'breakfast', 300)
+        url = reverse('myapp:recipe_list')
+
+        first = self.client.get(url, {'meal_type': 'lunch'})
+        page = first.context['recipes']
+        self.assertEqual(len(page), 24)
+        self.assertContains(first, f'meal_type=lunch&amp;cursor={page.next_cursor}')
+
+        second = self.client.get(url, {'meal_type': 'lunch', 'cursor': page.next_cursor})
+        names = [recipe.name for recipe in second.context['recipes']]
+        self.assertEqual(names, [f'Lunch {i:02}' for i in range(24, 30)])
+        self.assertFalse(second.context['recipes'].has_next)
+
+        # Other spellings of the same cursor share its cached page
+        with self.assertNumQueries(0):
+            self.client.get(url, {'meal_type': 'lunch', 'cursor': page.next_cursor + '='})
+
+    def test_malformed_cursors_are_not_cached(self):
+        make_recipe('Salad', 'lunch', 400)
+        url = reverse('myapp:recipe_list')
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'cursor': 'not-a-cursor'})
+            self.assertEqual([recipe.name for recipe in response.context['recipes']], ['Salad'])
+            self.assertTrue(queries.captured_queries)
+
+
+class ImportRecipesTests(CacheIsolatedTestCase):
+    def write_jsonl(self, rows):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False)
+        with handle:
+            for row in rows:
+                handle.write((row if isinstance(row, str) else json.dumps(row)) + '\n')
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def row(self, name, calories=300, **kwargs):
+        row = {
+            'name': name, 'description': 'Tasty', 'calories': calories,
+            'ingredients': '100 g rice, 1 egg', 'instructions': 'Cook',
+            'diet_types': 'vegetarian', 'meal_type': 'lunch',
+        }
+        row.update(kwargs)
+        return row
+
+    def test_upserts_in_batches_and_indexes_ingredients(self):
+        make_recipe('Bowl 1', 'lunch', 100)
+        path = self.write_jsonl([
+            self.row('Bowl 1', calories=450),
+            self.row('Bowl 2'),
+            self.row('Bad', meal_type='brunch'),
+            'not json',
+            self.row('Bowl 3', protein_g='12.5'),
+        ])
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', path, batch_size=2, stdout=out, stderr=err)
+
+        self.assertIn('Imported 3 recipes (2 rejected)', out.getvalue())
+        self.assertIn('Row 3: meal_type', err.getvalue())
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertEqual(Recipe.objects.get(name='Bowl 1').calories, 450)
+        self.assertEqual(Recipe.objects.get(name='Bowl 3').protein_g, 12.5)
+        self.assertEqual(
+            sorted(Recipe.objects.get(name='Bowl 2').recipe_ingredients.values_list('ingredient__name', 'quantity', 'unit')),
+            [('egg', 1, 'piece'), ('rice', 100, 'g')],
+        )
+
+    def test_resume_skips_committed_rows(self):
+        path = self.write_jsonl([self.row(f'Bowl {i}') for i in range(1, 6)])
+        checkpoint = path + '.checkpoint'
+        self.addCleanup(lambda: os.path.exists(checkpoint) and os.remove(checkpoint))
+        with open(checkpoint, 'w') as handle:
+            json.dump({'path': os.path.abspath(path), 'rows': 3}, handle)
+
+        call_command('import_recipes', path, checkpoint=checkpoint, resume=True, stdout=StringIO())
+        self.assertEqual(sorted(Recipe.objects.values_list('name', flat=True)), ['Bowl 4', 'Bowl 5'])
+        with open(checkpoint) as handle:
+            self.assertEqual(json.load(handle)['rows'], 5)
+
+
+class RecipeCatalogCacheTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = make_recipe('Porridge', 'breakfast', 300, ingredients='Oats, milk')
+
+    def test_detail_is_served_from_cache_until_recipe_changes(self):
+        url = reverse('myapp:recipe_detail', args=[self.recipe.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.context['ingredients'], ['Oats', 'milk'])
+
+        version = catalog_version()
+        self.recipe.name = 'Overnight Oats'
+        self.recipe.save()
+        self.assertGreater(catalog_version(), version)
+        self.assertContains(self.client.get(url), 'Overnight Oats')
+
+    def test_list_is_cached_per_filter(self):
+        make_recipe('Salad', 'lunch', 400)
+        url = reverse('myapp:recipe_list')
+        self.client.get(url, {'meal_type': 'lunch'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'meal_type': 'lunch'})
+        self.assertEqual([recipe.name for recipe in response.context['recipes']], ['Salad'])
+        self.assertEqual(len(self.client.get(url).context['recipes']), 2)
+
+    def test_culling_cached_pages_keeps_the_version(self):
+        version = catalog_version()
+        caches['default'].clear()
+        self.assertEqual(catalog_version(), version)
+
+    def test_missing_recipe_is_404(self):
+        response = self.client.get(reverse('myapp:recipe_detail', args=[self.recipe.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeSearchTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bowl = make_recipe('Quinoa Bowl', 'lunch', 450, ingredients='Quinoa, chickpeas, spinach')
+        self.curry = make_recipe('Chickpea Curry', 'dinner', 600, ingredients='Chickpeas, coconut milk, rice')
+        self.wrap = make_recipe('Chicken Wrap', 'lunch', 500, description='Quick wrap with quinoa salad',
+                                ingredients='Tortilla, chicken, lettuce')
+
+    def test_prefix_and_multi_word_queries(self):
+        self.assertEqual(set(search_recipe_ids('chick*')), {self.bowl.pk, self.curry.pk, self.wrap.pk})
+        self.assertEqual(search_recipe_ids('quinoa bowl'), [self.bowl.pk])
+        self.assertEqual(search_recipe_ids('"); DROP TABLE myapp_recipe; --'), [])
+        self.assertEqual(search_recipe_ids('   '), [])
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual([recipe.name for recipe in search_recipes('quinoa')], ['Quinoa Bowl', 'Chicken Wrap'])
+
+    def test_index_follows_updates_deletes_and_bulk_upserts(self):
+        self.curry.name = 'Lentil Dal'
+        self.curry.description = 'Warming dal'
+        self.curry.ingredients = 'Lentils, rice'
+        self.curry.save()
+        self.assertEqual(search_recipe_ids('curry'), [])
+        self.assertEqual(search_recipe_ids('lentil*'), [self.curry.pk])
+
+        self.wrap.delete()
+        self.assertEqual(search_recipe_ids('tortilla'), [])
+
+        Recipe.objects.bulk_create(
+            [Recipe(name='Quinoa Bowl', description='Now with tofu', calories=400, protein_g=0, carbs_g=0,
+                    fat_g=0, prep_time_min=10, ingredients='Quinoa, tofu', instructions='', diet_types='',
+                    meal_type='lunch')],
+            update_conflicts=True, unique_fields=['name'], update_fields=['description', 'ingredients'],
+        )
+        self.assertEqual(search_recipe_ids('tofu'), [self.bowl.pk])
+
+    def test_search_view_and_admin(self):
+        response = self.client.get(reverse('myapp:recipe_search'), {'q': 'chickpea*'})
+        self.assertEqual([recipe.name for recipe in response.context['recipes']], ['Chickpea Curry', 'Quinoa Bowl'])
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get(reverse('admin:myapp_recipe_changelist'), {'q': 'lettuce'})
+        self.assertEqual([recipe.name for recipe in response.context['cl'].result_list], ['Chicken Wrap'])
+
+
+@override_settings(REQUEST_PROFILING_SAMPLE_RATE=1.0)
+class RequestProfilingTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        request_stats.reset()
+        self.addCleanup(request_stats.reset)
+
+    def test_records_views_for_staff_endpoint(self):
+        make_catalog()
+        self.client.get(reverse('myapp:dashboard'))
+        self.client.get(reverse('myapp:dashboard'))
+
+        stats = request_stats.snapshot()['myapp:dashboard']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['max_queries'], 2)
+        self.assertEqual(sum(stats['histogram'].values()), 2)
+        self.assertTrue(stats['slowest_statements'])
+
+        url = reverse('myapp:performance_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        self.assertIn('myapp:dashboard', self.client.get(url).json()['views'])
+        self.assertEqual(self.client.post(url).json()['views'], {})
+
+    @override_settings(REQUEST_PROFILING_SLOW_MS=0)
+    def test_logs_slow_requests(self):
+        with self.assertLogs('myapp.performance', 'WARNING') as logs:
+            self.client.get(reverse('myapp:recipe_list'))
+        self.assertIn('myapp:recipe_list', logs.output[0])
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0)
+    def test_nothing_recorded_when_sampling_is_off(self):
+        self.client.get(reverse('myapp:dashboard'))
+        self.assertEqual(request_stats.snapshot(), {})
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0, REQUEST_PROFILING_SLOW_MS=0)
+    def test_unsampled_slow_requests_are_still_logged(self):
+        with self.assertLogs('myapp.performance', 'WARNING') as logs:
+            self.client.get(reverse('myapp:dashboard'))
+        self.assertIn('myapp:dashboard', logs.output[0])
+        self.assertEqual(request_stats.snapshot(), {})
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0, REQUEST_PROFILING_SLOW_MS=0)
+    async def test_unsampled_slow_requests_are_still_logged_under_asgi(self):
+        with self.assertLogs('myapp.performance', 'WARNING') as logs:
+            await self.async_client.get(reverse('myapp:recipe_list'))
+        self.assertIn('myapp:recipe_list', logs.output[0])
+
+
+class ApiTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog()
+        self.goal = make_goal()
+        self.meal_plan = MealPlan.objects.create(health_goal=self.goal, start_date=date.today())
+        generate_grocery_list(self.meal_plan, generate_meal_plan(self.meal_plan, self.goal, seed=1))
+
+    def test_plan_with_days_and_recipes(self):
+        url = reverse('myapp:api_meal_plan', args=[self.meal_plan.pk])
+        with self.assertNumQueries(3):
+            data = self.client.get(url).json()
+        self.assertEqual(data['health_goal__user_name'], 'Sam')
+        self.assertEqual(len(data['days']), 7)
+        self.assertIn(str(data['days'][0]['lunch_id']), data['recipes'])
+
+        data = self.client.get(url, {'fields': 'id,status'}).json()
+        self.assertEqual(set(data), {'id', 'status', 'days', 'recipes'})
+        response = self.client.get(url, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+        self.assertEqual(self.client.get(reverse('myapp:api_meal_plan', args=[999])).status_code, 404)
+
+    def test_grocery_items_are_gzipped(self):
+        url = reverse('myapp:api_grocery_items', args=[self.meal_plan.pk])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        items = self.client.get(url, {'fields': 'name,purchased'}).json()['items']
+        self.assertEqual(set(items[0]), {'name', 'purchased'})
+
+    def test_bulk_toggle(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        url = reverse('myapp:api_toggle_grocery_items', args=[self.meal_plan.pk])
+        first, second = self.meal_plan.grocery_items.values_list('pk', flat=True)[:2]
+        GroceryItem.objects.filter(pk=first).update(purchased=True)
+        before = MealPlan.objects.get(pk=self.meal_plan.pk).updated_at
+
+        response = client.post(url, {'ids': [first, second]}, content_type='application/json')
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(
+            dict(GroceryItem.objects.filter(pk__in=[first, second]).values_list('pk', 'purchased')),
+            {first: False, second: True},
+        )
+        self.assertGreater(MealPlan.objects.get(pk=self.meal_plan.pk).updated_at, before)
+
+        client.post(url, {'ids': [first, second], 'purchased': True}, content_type='application/json')
+        self.assertEqual(GroceryItem.objects.filter(pk__in=[first, second], purchased=True).count(), 2)
+        response = client.post(url, {'ids': 'all'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cross_site_form_posts_are_rejected(self):
+        # A form on another site can send text/plain without a preflight
+        client = self.client_class(enforce_csrf_checks=True)
+        item = self.meal_plan.grocery_items.first()
+        body = json.dumps({'ids': [item.pk], 'purchased': True})
+        response = client.post(
+            reverse('myapp:api_toggle_grocery_items', args=[self.meal_plan.pk]), body, content_type='text/plain',
+        )
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(GroceryItem.objects.get(pk=item.pk).purchased)
+
+        data = json.dumps({'user_name': 'Kim', 'goal': 'energy', 'diet_type': 'balanced', 'daily_calories': 2200})
+        response = client.post(reverse('myapp:api_create_meal_plan'), data, content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(HealthGoal.objects.filter(user_name='Kim').exists())
+
+    def test_create_plan(self):
+        data = {'user_name': 'Kim', 'goal': 'energy', 'diet_type': 'balanced', 'daily_calories': 2200}
+        response = self.client.post(reverse('myapp:api_create_meal_plan'), data, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        meal_plan = MealPlan.objects.get(pk=response.json()['id'])
+        self.assertEqual(response['Location'], reverse('myapp:api_meal_plan', args=[meal_plan.pk]))
+        self.assertEqual(meal_plan.meals.count(), 7)
+
+        response = self.client.post(reverse('myapp:api_create_meal_plan'), {'goal': 'energy'}, content_type='application/json')
+        self.assertIn('user_name', response.json()['errors'])
+
+    def test_recipes_are_keyset_paginated(self):
+        url = reverse('myapp:api_recipes')
+        with mock.patch.object(api, 'RECIPE_PAGE_SIZE', 15):
+            first = self.client.get(url, {'fields': 'id,calories'}).json()
+            second = self.client.get(url, {'fields': 'id,calories', 'cursor': first['next_cursor']}).json()
+        self.assertEqual(len(first['results']), 15)
+        self.assertEqual(set(first['results'][0]), {'id', 'calories', 'meal_type', 'name'})
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(len(self.client.get(url, {'meal_type': 'snack'}).json()['results']), 5)
+
+
+class AsyncViewTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog()
+        self.goal = make_goal()
+        self.meal_plan = MealPlan.objects.create(health_goal=self.goal, start_date=date.today())
+        generate_grocery_list(self.meal_plan, generate_meal_plan(self.meal_plan, self.goal, seed=1))
+
+    async def test_pages_render_under_asgi(self):
+        for url in (
+            reverse('myapp:dashboard'),
+            reverse('myapp:recipe_list'),
+            reverse('myapp:view_meal_plan', args=[self.meal_plan.pk]),
+            reverse('myapp:view_grocery_list', args=[self.meal_plan.pk]),
+        ):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+
+        url = reverse('myapp:view_meal_plan', args=[self.meal_plan.pk])
+        etag = (await self.async_client.get(url))['ETag']
+        response = await self.async_client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(reverse('myapp:view_meal_plan', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_catalog_cache_is_read_off_the_event_loop(self):
+        def off_loop(method):
+            def wrapper(*args, **kwargs):
+                with self.assertRaises(RuntimeError):
+                    asyncio.get_running_loop()
+                return method(*args, **kwargs)
+            return wrapper
+
+        recipe = await Recipe.objects.afirst()
+        for alias in ('default', 'catalog-version'):
+            cache = caches[alias]
+            for name in ('get', 'add', 'set'):
+                patcher = mock.patch.object(cache, name, off_loop(getattr(cache, name)))
+                patcher.start()
+                self.addCleanup(patcher.stop)
+        for url in (
+            reverse('myapp:recipe_list'),
+            reverse('myapp:recipe_detail', args=[recipe.pk]),
+            reverse('myapp:view_meal_plan', args=[self.meal_plan.pk]),
+        ):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1.0)
+    async def test_profiling_records_async_queries(self):
+        request_stats.reset()
+        self.addCleanup(request_stats.reset)
+        await self.async_client.get(reverse('myapp:dashboard'))
+        self.assertEqual(request_stats.snapshot()['myapp:dashboard']['max_queries'], 2)
+
+
+@override_settings(MEAL_PLAN_ENGINE='myapp.planning.RandomEngine')
+class PlanEditingTests(CacheIsolatedTestCase):
+    def setUp(self):
+        super().setUp()
+        # Every recipe has an ingredient of its own, plus milk shared by all
+        for meal_type, base in [('breakfast', 400), ('lunch', 600), ('dinner', 550), ('snack', 150)]:
+            for i in range(6):
+                make_recipe(
+                    f'{meal_type} {i}', meal_type, base + i * 20,
+                    ingredients=f'100 g {meal_type} grain {i}, 1 cup milk',
+                )
+        self.goal = make_goal()
+        self.meal_plan = MealPlan.objects.create(health_goal=self.goal, start_date=date.today(), days=14)
+        generate_grocery_list(self.meal_plan, generate_meal_plan(self.meal_plan, self.goal))
+        self.meal_plan.refresh_from_db()
+
+    def grocery_list(self):
+        return sorted(
+            (item.ingredient_id, item.base_unit, item.name, item.quantity, item.ref_count)
+            for item in self.meal_plan.grocery_items.all()
+        )
+
+    def rebuilt_grocery_list(self):
+        return sorted(
+            (item.ingredient_id, item.base_unit, item.name, item.quantity, item.ref_count)
+            for item in build_grocery_items(self.meal_plan, self.meal_plan.meals.all())
+        )
+
+    def test_plans_span_several_weeks_with_dates(self):
+        response = self.client.post(reverse('myapp:create_health_goal'), {
+            'user_name': 'Ana', 'goal': 'maintenance', 'diet_type': 'balanced',
+            'daily_calories': 2000, 'weeks': 4,
+        })
+        meal_plan = MealPlan.objects.latest('pk')
+        self.assertRedirects(response, reverse('myapp:view_meal_plan', args=[meal_plan.pk]))
+        self.assertEqual(meal_plan.days, 28)
+        dates = list(meal_plan.meals.order_by('day_number').values_list('date', flat=True))
+        self.assertEqual(dates, [meal_plan.start_date + timedelta(days=day) for day in range(28)])
+
+        response = self.client.get(reverse('myapp:view_meal_plan', args=[meal_plan.pk]))
+        self.assertContains(response, '28-Day Meal Plan')
+
+    def test_swap_changes_one_slot_and_patches_the_grocery_list(self):
+        day = self.meal_plan.meals.get(day_number=3)
+        milk = self.meal_plan.grocery_items.get(name='Milk')
+        milk.purchased = True
+        milk.save()
+
+        response = self.client.post(reverse('myapp:swap_meal_slot', args=[self.meal_plan.pk, 3, 'dinner']))
+        self.assertRedirects(response, reverse('myapp:view_meal_plan', args=[self.meal_plan.pk]))
+
+        swapped = self.meal_plan.meals.select_related('breakfast', 'lunch', 'dinner', 'snack').get(day_number=3)
+        self.assertNotEqual(swapped.dinner_id, day.dinner_id)
+        self.assertEqual(
+            (swapped.breakfast_id, swapped.lunch_id, swapped.snack_id),
+            (day.breakfast_id, day.lunch_id, day.snack_id),
+        )
+        self.assertEqual(
+            swapped.total_calories,
+            sum(recipe.calories for recipe in (swapped.breakfast, swapped.lunch, swapped.dinner, swapped.snack)),
+        )
+        self.assertEqual(self.grocery_list(), self.rebuilt_grocery_list())
+        # Milk was already on the list, so it is updated in place
+        self.assertTrue(self.meal_plan.grocery_items.get(pk=milk.pk).purchased)
+
+    def test_regenerating_a_day_leaves_the_other_days_alone(self):
+        others = list(self.meal_plan.meals.exclude(day_number=5).values_list('breakfast', 'lunch', 'dinner', 'snack'))
+        meal_plan = MealPlan.objects.select_related('health_goal').get(pk=self.meal_plan.pk)
+        daily_meal, (created, updated, deleted) = replan_day(meal_plan, 5)
+
+        self.assertEqual(
+            list(self.meal_plan.meals.exclude(day_number=5).values_list('breakfast', 'lunch', 'dinner', 'snack')),
+            others,
+        )
+        self.assertTrue(created or updated or deleted)
+        self.assertEqual(self.grocery_list(), self.rebuilt_grocery_list())
+        self.assertGreater(MealPlan.objects.get(pk=self.meal_plan.pk).updated_at, self.meal_plan.updated_at)
+
+    def test_api_reports_the_grocery_changes(self):
+        url = reverse('myapp:api_regenerate_day', args=[self.meal_plan.pk, 2])
+        self.assertEqual(self.client.post(url).status_code, 415)
+        response = self.client.post(url, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['day']['day_number'], 2)
+        self.assertEqual(set(data['grocery_items']), {'created', 'updated', 'deleted'})
+        self.assertEqual(self.grocery_list(), self.rebuilt_grocery_list())
+
+        response = self.client.post(
+            reverse('myapp:api_swap_meal_slot', args=[self.meal_plan.pk, 2, 'brunch']), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            reverse('myapp:api_regenerate_day', args=[self.meal_plan.pk, 15]), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_ledger_stays_equal_to_a_full_rebuild(self):
+        meal_plan = MealPlan.objects.select_related('health_goal').get(pk=self.meal_plan.pk)
+        rng = random.Random(3)
+        for _ in range(10):
+            replan_day(meal_plan, rng.randint(1, 14), [rng.choice(['breakfast', 'lunch', 'dinner', 'snack'])])
+        self.assertEqual(self.grocery_list(), self.rebuilt_grocery_list())
+
+    def test_day_edited_during_the_search_is_solved_again(self):
+        meal_plan = MealPlan.objects.select_related('health_goal').get(pk=self.meal_plan.pk)
+        searches = []
+
+        def racing_search(*args):
+            picks = solve_day(*args)
+            searches.append(args[1])
+            if len(searches) == 1:
+                # Another request swaps the same slot before this one writes
+                replan_day(meal_plan, 3, ['dinner'])
+            return picks
+
+        with mock.patch('myapp.views.solve_day', side_effect=racing_search):
+            replan_day(meal_plan, 3, ['dinner'])
+        self.assertEqual(len(searches), 3)
+        self.assertEqual(self.grocery_list(), self.rebuilt_grocery_list())
+
+    def test_delta_drops_unused_rows_and_keeps_purchases(self):
+        day = self.meal_plan.meals.select_related('breakfast').get(day_number=1)
+        servings = self.meal_plan.meals.filter(breakfast=day.breakfast).count()
+        number = day.breakfast.name.split()[-1]
+        grain = self.meal_plan.grocery_items.get(name=f'Breakfast grain {number}')
+        milk = self.meal_plan.grocery_items.get(name='Milk')
+        self.meal_plan.grocery_items.update(purchased=True)
+
+        # Ingredient sums, ledger rows, one upsert, one delete
+        with self.assertNumQueries(4):
+            created, updated, deleted = update_grocery_list(self.meal_plan, Counter({day.breakfast_id: -servings}))
+        self.assertEqual((len(created), len(updated), [item.pk for item in deleted]), (0, 1, [grain.pk]))
+        self.assertFalse(self.meal_plan.grocery_items.filter(pk=grain.pk).exists())
+        refreshed = self.meal_plan.grocery_items.get(pk=milk.pk)
+        self.assertEqual(refreshed.ref_count, milk.ref_count - servings)
+        self.assertTrue(refreshed.purchased)
+
+    def test_swap_between_amounts_of_a_shared_ingredient(self):
+        large = make_recipe('Large latte', 'snack', 200, ingredients='2 cup milk')
+        small = make_recipe('Small latte', 'snack', 120, ingredients='1 cup milk')
+        meal_plan = MealPlan.objects.create(health_goal=self.goal, start_date=date.today(), days=1)
+        day = DailyMeal.objects.create(meal_plan=meal_plan, day_number=1, date=date.today(), snack=large)
+        generate_grocery_list(meal_plan, [day])
+        self.assertEqual(meal_plan.grocery_items.get().quantity, '480 ml')
+
+        DailyMeal.objects.filter(pk=day.pk).update(snack=small)
+        created, updated, deleted = update_grocery_list(meal_plan, Counter({large.pk: -1, small.pk: 1}))
+        self.assertEqual((len(created), len(updated), len(deleted)), (0, 1, 0))
+        milk = meal_plan.grocery_items.get()
+        self.assertEqual((milk.quantity, milk.ref_count), ('240 ml', 1))
+
+    def test_editing_or_deleting_a_recipe_updates_the_ledger(self):
+        day = self.meal_plan.meals.select_related('dinner').get(day_number=1)
+        dinner = day.dinner
+        dinner.ingredients = '2 cup milk, 1 lemon'
+        dinner.save()
+        self.assertEqual(self.grocery_list(), self.rebuilt_grocery_list())
+        self.assertTrue(self.meal_plan.grocery_items.filter(name='Lemon').exists())
+
+        dinner.delete()
+        self.assertEqual(self.grocery_list(), self.rebuilt_grocery_list())
+        self.assertFalse(self.meal_plan.grocery_items.filter(name='Lemon').exists())
+        self.assertGreater(MealPlan.objects.get(pk=self.meal_plan.pk).updated_at, self.meal_plan.updated_at)
+
+    def test_importing_over_a_served_recipe_updates_the_ledger(self):
+        lunch = self.meal_plan.meals.select_related('lunch').get(day_number=1).lunch
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as handle:
+            handle.write(json.dumps({
+                'name': lunch.name, 'description': 'Tasty', 'calories': lunch.calories,
+                'ingredients': '200 g rice, 1 cup milk', 'instructions': 'Cook',
+                'diet_types': 'vegetarian', 'meal_type': 'lunch',
+            }) + '\n')
+        self.addCleanup(os.remove, handle.name)
+        call_command('import_recipes', handle.name, stdout=StringIO())
+        self.assertEqual(self.grocery_list(), self.rebuilt_grocery_list())
+        self.assertTrue(self.meal_plan.grocery_items.filter(name='Rice').exists())
+
+    def test_admin_edits_touch_the_plan_and_its_ledger(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        day = self.meal_plan.meals.get(day_number=1)
+        dinner = Recipe.objects.filter(meal_type='dinner').exclude(pk=day.dinner_id).first()
+        response = self.client.post(reverse('admin:myapp_dailymeal_change', args=[day.pk]), {
+            'meal_plan': self.meal_plan.pk, 'day_number': 1, 'date': day.date,
+            'breakfast': day.breakfast_id, 'lunch': day.lunch_id, 'dinner': dinner.pk, 'snack': day.snack_id,
+        })
+        self.assertRedirects(response, reverse('admin:myapp_dailymeal_changelist'))
+        self.assertEqual(self.grocery_list(), self.rebuilt_grocery_list())
+        touched = MealPlan.objects.get(pk=self.meal_plan.pk).updated_at
+        self.assertGreater(touched, self.meal_plan.updated_at)
+
+        item = self.meal_plan.grocery_items.first()
+        response = self.client.post(reverse('admin:myapp_groceryitem_delete', args=[item.pk]), {'post': 'yes'})
+        self.assertRedirects(response, reverse('admin:myapp_groceryitem_changelist'))
+        self.assertGreater(MealPlan.objects.get(pk=self.meal_plan.pk).updated_at, touched)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'myapp'
 
@@ -9,6 +9,19 @@ urlpatterns = [
     path('meal-plan/<int:pk>/', views.view_meal_plan, name='view_meal_plan'),
     path('grocery-list/<int:pk>/', views.view_grocery_list, name='view_grocery_list'),
     path('recipes/', views.recipe_list, name='recipe_list'),
+    path('recipes/search/', views.recipe_search, name='recipe_search'),
     path('recipe/<int:pk>/', views.recipe_detail, name='recipe_detail'),
+    path('meal-plan/<int:pk>/day/<int:day_number>/regenerate/', views.regenerate_day, name='regenerate_day'),
+    path('meal-plan/<int:pk>/day/<int:day_number>/<slug:slot>/swap/', views.swap_meal_slot, name='swap_meal_slot'),
     path('grocery/<int:pk>/toggle/', views.mark_grocery_purchased, name='mark_grocery_purchased'),
+    path('performance/', views.performance_stats, name='performance_stats'),
+    path('api/plans/', api.create_meal_plan, name='api_create_meal_plan'),
+    path('api/plans/<int:pk>/', api.meal_plan, name='api_meal_plan'),
+    path('api/plans/<int:pk>/days/', api.meal_plan_days, name='api_meal_plan_days'),
+    path('api/plans/<int:pk>/days/<int:day_number>/regenerate/', api.regenerate_day, name='api_regenerate_day'),
+    path('api/plans/<int:pk>/days/<int:day_number>/<slug:slot>/swap/', api.swap_meal_slot, name='api_swap_meal_slot'),
+    path('api/plans/<int:pk>/grocery-items/', api.grocery_items, name='api_grocery_items'),
+    path('api/plans/<int:pk>/grocery-items/toggle/', api.toggle_grocery_items, name='api_toggle_grocery_items'),
+    path('api/recipes/', api.recipes, name='api_recipes'),
+    path('api/recipes/<int:pk>/', api.recipe, name='api_recipe'),
 ]
@@ -1,10 +1,40 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib import messages
+from django.db import transaction
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods, require_POST
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
 from datetime import datetime, timedelta
-from collections import defaultdict
-from .models import HealthGoal, Recipe, MealPlan, DailyMeal, GroceryItem
-from .forms import HealthGoalForm, RecipeForm
+from functools import wraps
+from urllib.parse import urlencode
+import hashlib
 import random
+from collections import Counter
+from .models import HealthGoal, Recipe, DietTag, MealPlan, DailyMeal, GroceryItem, GenerationJob
+from .cache import acached_catalog, acatalog_version, catalog_version
+from .catalog import ExclusionMatcher
+from .forms import HealthGoalForm, RecipeFilterForm
+from .groceries import aggregate_ingredients, apply_ledger_delta, build_grocery_items
+from .middleware import request_stats
+from .pagination import akeyset_page, decode_cursor, encode_cursor
+from .planning import MEAL_SLOTS, PlanTargets, get_engine, memoized_week, profile_key, recipe_pool
+from .search import search_recipes
+
+DASHBOARD_PAGE_SIZE = 24
+
+RECIPE_PAGE_SIZE = 24
+
+SEARCH_RESULT_LIMIT = 50
+
+# Searches replan_day runs outside the write lock before solving under it
+REPLAN_ATTEMPTS = 3
+
+SLOT_IDS = [f'{slot}_id' for slot in MEAL_SLOTS]
 
 
 def create_health_goal(request):
@@ -12,214 +42,429 @@ def create_health_goal(request):
     if request.method == 'POST':
         form = HealthGoalForm(request.POST)
         if form.is_valid():
-            health_goal = form.save()
-            
-            # Create meal plan
-            meal_plan = MealPlan.objects.create(
-                health_goal=health_goal,
-                start_date=datetime.now().date()
-            )
-            
-            # Generate 7-day meal plan
-            generate_meal_plan(meal_plan, health_goal)
-            
-            # Generate grocery list
-            generate_grocery_list(meal_plan)
-            
-            messages.success(request, 'Health goal created! Meal plan generated.')
-            return redirect('view_meal_plan', pk=meal_plan.pk)
+            meal_plan = create_goal_with_plan(form)
+            if meal_plan.status == 'pending':
+                messages.success(request, 'Health goal created! Your meal plan is being generated.')
+            else:
+                messages.success(request, 'Health goal created! Meal plan generated.')
+            return redirect('myapp:view_meal_plan', pk=meal_plan.pk)
     else:
         form = HealthGoalForm()
     
     return render(request, 'myapp/create_health_goal.html', {'form': form})
 
 
-def generate_meal_plan(meal_plan, health_goal):
-    """Generate intelligent 7-day meal plan based on health goals"""
+def create_goal_with_plan(form):
+    """Save a valid HealthGoalForm with a new meal plan and return the plan.
+
+    The plan is generated right away, or queued for the worker when
+    ``MEAL_PLAN_ASYNC`` is on.
+    """
+    generate_async = getattr(settings, 'MEAL_PLAN_ASYNC', False)
+    days = 7 * (form.cleaned_data.get('weeks') or 1)
     
-    # Get recipes matching the user's diet type
-    diet_types = health_goal.diet_type
-    breakfast_recipes = Recipe.objects.filter(
-        meal_type='breakfast'
-    ).exclude(
-        diet_types__icontains='_not_' + diet_types
-    )
+    # Search for the plan before the transaction takes the write lock
+    week = None if generate_async else plan_week(form.save(commit=False), days=days)
     
-    lunch_recipes = Recipe.objects.filter(
-        meal_type='lunch'
-    )
+    # Persist the goal, plan, days and grocery list in one transaction
+    with transaction.atomic():
+        health_goal = form.save()
+        
+        # Create meal plan
+        meal_plan = MealPlan.objects.create(
+            health_goal=health_goal,
+            start_date=datetime.now().date(),
+            days=days,
+            status='pending' if generate_async else 'ready',
+        )
+        
+        if generate_async:
+            # Leave generation to the process_generation_jobs worker
+            GenerationJob.objects.create(meal_plan=meal_plan)
+        else:
+            # Generate the plan's days
+            daily_meals = generate_meal_plan(meal_plan, health_goal, week=week)
+            
+            # Generate grocery list
+            generate_grocery_list(meal_plan, daily_meals)
+    return meal_plan
+
+
+def plan_week(health_goal, seed=None, days=7):
+    """Pick the recipes of a ``days``-day plan for a goal without writing anything.
+
+    Only needs the goal's fields, so it works on an unsaved goal and can run
+    before a transaction is opened. Plans are memoized per goal profile, seed,
+    length and catalog version.
+    """
+    if seed is None:
+        seed = MealPlan.DEFAULT_SEED
     
-    dinner_recipes = Recipe.objects.filter(
-        meal_type='dinner'
-    )
+    # Recipes allowed by the diet, loaded once per catalog version; every slot
+    # is picked from memory
+    exclusions = ExclusionMatcher.from_goal(health_goal)
+    pool = recipe_pool(health_goal.diet_type).without(exclusions)
     
-    snack_recipes = Recipe.objects.filter(
-        meal_type='snack'
-    )
+    # Calorie and macro targets based on health goal
+    targets = PlanTargets.from_goal(health_goal)
     
-    # Filter by calories based on health goal
-    if health_goal.daily_calories > 0:
-        target_per_meal = health_goal.daily_calories / 3.5
-    else:
-        target_per_meal = 500
-    
-    # Create 7 daily meals
-    for day in range(1, 8):
-        daily_meal = DailyMeal.objects.create(
-            meal_plan=meal_plan,
-            day_number=day,
-            breakfast=select_random_recipe(breakfast_recipes, target_per_meal * 0.25) or breakfast_recipes.first(),
-            lunch=select_random_recipe(lunch_recipes, target_per_meal * 0.35) or lunch_recipes.first(),
-            dinner=select_random_recipe(dinner_recipes, target_per_meal * 0.35) or dinner_recipes.first(),
-            snack=select_random_recipe(snack_recipes, target_per_meal * 0.05) or snack_recipes.first(),
+    return memoized_week(pool, targets, profile_key(health_goal, exclusions, seed, days), seed, days)
+
+
+def generate_meal_plan(meal_plan, health_goal, seed=None, week=None):
+    """Generate the ``meal_plan.days`` days of a plan based on health goals.
+    
+    ``seed`` overrides ``meal_plan.seed``. ``week`` may be passed from an
+    earlier ``plan_week`` call so the search runs outside the caller's
+    transaction.
+    """
+    if week is None:
+        week = plan_week(health_goal, seed=meal_plan.seed if seed is None else seed, days=meal_plan.days)
+    
+    # Create every daily meal in a single insert
+    daily_meals = []
+    for day, slots in enumerate(week, start=1):
+        daily_meal = DailyMeal(
+            meal_plan=meal_plan, day_number=day,
+            date=meal_plan.start_date + timedelta(days=day - 1), **slots
         )
+        daily_meal.compute_totals()
+        daily_meals.append(daily_meal)
+    return DailyMeal.objects.bulk_create(daily_meals)
 
 
-def select_random_recipe(recipes, target_calories):
-    """Select a random recipe close to target calories"""
-    if not recipes.exists():
-        return None
+def generate_grocery_list(meal_plan, daily_meals=None):
+    """Generate grocery list from meal plan.
+
+    ``daily_meals`` may be passed when the caller already holds the days in
+    memory (e.g. straight from ``generate_meal_plan``) to skip re-reading them.
+    Quantities come pre-parsed from RecipeIngredient and are summed per
+    ingredient in compatible units.
+    """
+    if daily_meals is None:
+        daily_meals = meal_plan.meals.only('breakfast', 'lunch', 'dinner', 'snack')
+    
+    return GroceryItem.objects.bulk_create(build_grocery_items(meal_plan, daily_meals))
+
+
+def replan_day(meal_plan, day_number, slots=MEAL_SLOTS, engine=None):
+    """Re-pick some slots of one day of a plan, keeping every other day.
+
+    Only ``slots`` are solved again; the day's stored totals are recomputed
+    and the grocery ledger gets the delta of the recipes that came or went,
+    instead of regenerating the plan. Returns the day and the
+    ``(created, updated, deleted)`` grocery items.
+    """
+    health_goal = meal_plan.health_goal
+    pool = recipe_pool(health_goal.diet_type).without(ExclusionMatcher.from_goal(health_goal))
+    targets = PlanTargets.from_goal(health_goal)
+    if engine is None:
+        engine = get_engine()
+    
+    for _ in range(REPLAN_ATTEMPTS):
+        # Search outside the write transaction so the lock only covers the writes
+        daily_meal, before, day = solve_day(meal_plan, day_number, slots, engine, pool, targets)
+        with transaction.atomic():
+            # A concurrent edit of the day would make the ledger delta wrong;
+            # solve again from what it holds now
+            current = meal_plan.meals.filter(pk=daily_meal.pk).values_list(*SLOT_IDS).first()
+            if current == tuple(before[slot] for slot in MEAL_SLOTS):
+                return daily_meal, save_replanned_day(meal_plan, daily_meal, before, day, slots)
+    
+    # Still contended: solve under the write lock so the edit goes through
+    with transaction.atomic():
+        daily_meal, before, day = solve_day(meal_plan, day_number, slots, engine, pool, targets)
+        return daily_meal, save_replanned_day(meal_plan, daily_meal, before, day, slots)
+
+
+def solve_day(meal_plan, day_number, slots, engine, pool, targets):
+    """Read one day of a plan and re-pick ``slots`` of it in memory.
+
+    Returns the day, its ``{slot: recipe_id}`` before the edit and the new
+    ``{slot: recipe}`` picks.
+    """
+    daily_meal = meal_plan.meals.only('meal_plan', 'day_number', *MEAL_SLOTS).get(day_number=day_number)
     
-    # Try to find recipes within 20% of target calories
-    similar = recipes.filter(
-        calories__gte=target_calories * 0.8,
-        calories__lte=target_calories * 1.2
+    # Servings per recipe over the whole plan, for variety
+    counts = Counter(
+        recipe_id for row in meal_plan.meals.values_list(*SLOT_IDS) for recipe_id in row if recipe_id is not None
     )
+    before = {slot: getattr(daily_meal, f'{slot}_id') for slot in MEAL_SLOTS}
+    uses = counts.copy()
+    uses.subtract(before[slot] for slot in slots if before[slot] is not None)
     
-    if similar.exists():
-        return similar.order_by('?').first()
-    
-    return recipes.order_by('?').first()
-
-
-def generate_grocery_list(meal_plan):
-    """Generate grocery list from meal plan"""
-    
-    grocery_items = defaultdict(list)
-    
-    # Collect all ingredients from meals
-    for daily_meal in meal_plan.meals.all():
-        for meal in [daily_meal.breakfast, daily_meal.lunch, daily_meal.dinner, daily_meal.snack]:
-            if meal:
-                ingredients = [ing.strip() for ing in meal.ingredients.split(',')]
-                for ingredient in ingredients:
-                    # Parse quantity if present (simple parsing)
-                    parts = ingredient.rsplit(' ', 1)
-                    if len(parts) == 2 and parts[1].isdigit():
-                        item_name = parts[0]
-                        quantity = int(parts[1])
-                    else:
-                        item_name = ingredient
-                        quantity = 1
-                    
-                    grocery_items[item_name].append(quantity)
-    
-    # Create grocery items, consolidating duplicates
-    category_map = {
-        'vegetable': 'produce',
-        'fruit': 'produce',
-        'chicken': 'meat',
-        'beef': 'meat',
-        'fish': 'meat',
-        'milk': 'dairy',
-        'cheese': 'dairy',
-        'yogurt': 'dairy',
-        'rice': 'grains',
-        'bread': 'grains',
-        'oil': 'pantry',
-        'salt': 'pantry',
-    }
+    day = {slot: pool.by_pk.get(before[slot]) for slot in MEAL_SLOTS}
+    engine.replan(pool, targets, day, slots, random.Random(), uses)
+    return daily_meal, before, day
+
+
+def save_replanned_day(meal_plan, daily_meal, before, day, slots):
+    """Write the new picks of ``slots`` and their grocery delta; call inside a transaction.
+
+    Returns the ``(created, updated, deleted)`` grocery items.
+    """
+    changed = [slot for slot in slots if day[slot] is not None and day[slot].pk != before[slot]]
+    if not changed:
+        return [], [], []
+    for slot in MEAL_SLOTS:
+        # Pool recipes carry the nutrition columns, so the totals cost no queries
+        if day[slot] is not None:
+            setattr(daily_meal, slot, day[slot])
+    daily_meal.compute_totals()
     
-    for item_name, quantities in grocery_items.items():
-        total_quantity = sum(quantities)
-        
-        # Determine category
-        category = 'pantry'
-        item_lower = item_name.lower()
-        for keyword, cat in category_map.items():
-            if keyword in item_lower:
-                category = cat
-                break
-        
-        GroceryItem.objects.create(
-            meal_plan=meal_plan,
-            name=item_name,
-            quantity=f"{total_quantity} units",
-            category=category
-        )
+    servings = Counter(day[slot].pk for slot in changed)
+    servings.subtract(before[slot] for slot in changed if before[slot] is not None)
+    
+    daily_meal.save(update_fields=changed + ['total_calories', 'total_protein_g', 'total_carbs_g', 'total_fat_g'])
+    grocery_changes = update_grocery_list(meal_plan, servings)
+    MealPlan.touch(meal_plan.pk)
+    return grocery_changes
+
 
+def update_grocery_list(meal_plan, servings):
+    """Apply a change in recipe servings to the plan's grocery ledger.
 
-def view_meal_plan(request, pk):
+    Returns the ``(created, updated, deleted)`` items of ``ledger_changes``.
+    """
+    return apply_ledger_delta(meal_plan.pk, aggregate_ingredients(servings))
+
+
+async def plan_state(pk):
+    """(updated_at, status) of a plan from a single primary-key lookup"""
+    return await MealPlan.objects.filter(pk=pk).values_list('updated_at', 'status').afirst()
+
+
+async def meal_plan_etag(request, pk):
+    state = await plan_state(pk)
+    if state is None:
+        return None
+    # Recipe names and numbers on the page come from the catalog too
+    return f'plan-{pk}-{state[0].timestamp()}-{state[1]}-{await acatalog_version()}'
+
+
+async def grocery_list_etag(request, pk):
+    state = await plan_state(pk)
+    if state is None:
+        return None
+    return f'grocery-{pk}-{state[0].timestamp()}-{state[1]}'
+
+
+def catalog_etag(request, *args, **kwargs):
+    return f'catalog-{catalog_version()}'
+
+
+async def acatalog_etag(request, *args, **kwargs):
+    return f'catalog-{await acatalog_version()}'
+
+
+def async_condition(etag_func):
+    """``condition(etag_func=...)`` for async views with an async ``etag_func``.
+
+    Django's decorator calls ``etag_func`` synchronously, and the ORM refuses
+    synchronous queries inside the event loop.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if etag and request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+# The read-heavy pages below are async so an ASGI worker can serve many
+# readers at once; every query goes through the async ORM and templates
+# only see objects that are already loaded.
+
+@cache_control(private=True, no_cache=True)
+@async_condition(etag_func=meal_plan_etag)
+async def view_meal_plan(request, pk):
     """View the generated meal plan"""
-    meal_plan = get_object_or_404(MealPlan, pk=pk)
-    daily_meals = meal_plan.meals.all().order_by('day_number')
+    meal_plan = await aget_object_or_404(MealPlan.objects.select_related('health_goal'), pk=pk)
+    if meal_plan.status != 'ready':
+        return render(request, 'myapp/meal_plan_pending.html', {'meal_plan': meal_plan})
+    
+    # Load all days with their four recipes in one query so the template's
+    # per-slot lookups and the per-day totals never touch the database
+    daily_meals = [
+        daily_meal async for daily_meal in meal_plan.meals.select_related(
+            'breakfast', 'lunch', 'dinner', 'snack'
+        ).order_by('day_number')
+    ]
     
     context = {
         'meal_plan': meal_plan,
         'daily_meals': daily_meals,
         'health_goal': meal_plan.health_goal,
+        'meal_slots': MEAL_SLOTS,
+        # Part of the day card fragment cache keys
+        'catalog_version': await acatalog_version(),
     }
     
     return render(request, 'myapp/meal_plan.html', context)
 
 
-def view_grocery_list(request, pk):
+@cache_control(private=True, no_cache=True)
+@async_condition(etag_func=grocery_list_etag)
+async def view_grocery_list(request, pk):
     """View grocery list for meal plan"""
-    meal_plan = get_object_or_404(MealPlan, pk=pk)
+    meal_plan = await aget_object_or_404(MealPlan.objects.select_related('health_goal'), pk=pk)
+    if meal_plan.status != 'ready':
+        return render(request, 'myapp/meal_plan_pending.html', {'meal_plan': meal_plan})
+    
+    # Spend per category, purchased and still to buy, summed by the database
+    subtotals = {
+        row['category']: row
+        async for row in meal_plan.grocery_items.order_by().values('category').annotate(
+            total=Sum('estimated_price', default=0),
+            purchased=Sum('estimated_price', filter=Q(purchased=True), default=0),
+        )
+    }
     
-    # Group items by category
-    items_by_category = defaultdict(list)
-    for item in meal_plan.grocery_items.all():
-        items_by_category[item.get_category_display()].append(item)
+    # One pass over the items, already in category order
+    categories = []
+    async for item in meal_plan.grocery_items.order_by('category', 'name'):
+        if not categories or categories[-1]['category'] != item.category:
+            subtotal = subtotals[item.category]
+            categories.append({
+                'category': item.category,
+                'name': item.get_category_display(),
+                'items': [],
+                'total': subtotal['total'],
+                'purchased': subtotal['purchased'],
+                'remaining': subtotal['total'] - subtotal['purchased'],
+            })
+        categories[-1]['items'].append(item)
     
-    total_price = sum(item.estimated_price for item in meal_plan.grocery_items.all())
+    total_price = sum(row['total'] for row in subtotals.values())
+    purchased_price = sum(row['purchased'] for row in subtotals.values())
     
     context = {
         'meal_plan': meal_plan,
-        'items_by_category': dict(items_by_category),
+        'categories': categories,
         'total_price': total_price,
+        'purchased_price': purchased_price,
+        'remaining_price': total_price - purchased_price,
     }
     
     return render(request, 'myapp/grocery_list.html', context)
 
 
-def dashboard(request):
+async def dashboard(request):
     """Dashboard showing all health goals and meal plans"""
-    health_goals = HealthGoal.objects.all().order_by('-created_at')
-    meal_plans = MealPlan.objects.all().order_by('-created_at')[:5]
+    # Latest plan per goal as a correlated subquery instead of two queries per card
+    latest_plan = MealPlan.objects.filter(
+        health_goal=OuterRef('pk')
+    ).order_by('-created_at', '-pk').values('pk')[:1]
+    health_goals = HealthGoal.objects.annotate(latest_plan_id=Subquery(latest_plan))
+    
+    # Keyset pagination keeps deep pages as cheap as the first one
+    page = await akeyset_page(
+        health_goals, ['-created_at', '-pk'],
+        cursor=request.GET.get('cursor'), page_size=DASHBOARD_PAGE_SIZE,
+    )
+    
+    counts = await HealthGoal.objects.aaggregate(
+        goal_count=Count('pk', distinct=True),
+        plan_count=Count('mealplan'),
+    )
     
     context = {
-        'health_goals': health_goals,
-        'meal_plans': meal_plans,
+        'health_goals': page,
+        'goal_count': counts['goal_count'],
+        'plan_count': counts['plan_count'],
     }
     
     return render(request, 'myapp/dashboard.html', context)
 
 
-def recipe_list(request):
-    """List all recipes"""
-    recipes = Recipe.objects.all()
-    meal_type_filter = request.GET.get('meal_type')
+@cache_control(no_cache=True)
+@async_condition(etag_func=acatalog_etag)
+async def recipe_list(request):
+    """List recipes, filtered and keyset-paginated"""
+    form = RecipeFilterForm(request.GET)
+    filters = {}
+    if form.is_valid():
+        filters = {name: value for name, value in form.cleaned_data.items() if value not in (None, '')}
+    cursor = request.GET.get('cursor', '')
+    # (meal_type, name) matches Meta.ordering and its index; name is unique
+    ordering = ['meal_type', 'name']
+    
+    async def load_page():
+        recipes = Recipe.objects.prefetch_related('diet_tags')
+        if filters:
+            recipes = form.filter(recipes)
+        return await akeyset_page(recipes, ordering, cursor=cursor, page_size=RECIPE_PAGE_SIZE)
+    
+    async def load_diet_tags():
+        return [tag async for tag in DietTag.objects.all()]
+    
+    values = decode_cursor(Recipe, ordering, cursor) if cursor else []
+    if values is None:
+        # Malformed cursors fall back to the first page; don't give each one
+        # a shared cache entry
+        page = await load_page()
+    else:
+        # Key on the decoded position so spellings of one cursor share a page
+        key = hashlib.md5(urlencode(sorted(filters.items()) + [('cursor', encode_cursor(values))]).encode()).hexdigest()
+        page = await acached_catalog(f'recipe-list:{key}', load_page)
     
-    if meal_type_filter:
-        recipes = recipes.filter(meal_type=meal_type_filter)
+    # Links keep the active filters and only swap the cursor
+    query = request.GET.copy()
+    query.pop('cursor', None)
     
     context = {
-        'recipes': recipes,
+        'recipes': page,
+        'form': form,
+        'filter_query': query.urlencode(),
         'meal_types': Recipe._meta.get_field('meal_type').choices,
+        'diet_tags': await acached_catalog('diet-tags', load_diet_tags),
+        # Part of the recipe card fragment cache keys
+        'catalog_version': await acatalog_version(),
     }
     
     return render(request, 'myapp/recipe_list.html', context)
 
 
-def recipe_detail(request, pk):
-    """View recipe details"""
-    recipe = get_object_or_404(Recipe, pk=pk)
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag)
+def recipe_search(request):
+    """Full-text recipe search, best matches first"""
+    query = request.GET.get('q', '').strip()
+    recipes = []
+    if query:
+        recipes = search_recipes(query, Recipe.objects.prefetch_related('diet_tags'), limit=SEARCH_RESULT_LIMIT)
     
     context = {
-        'recipe': recipe,
-        'ingredients': [ing.strip() for ing in recipe.ingredients.split(',')],
+        'query': query,
+        'recipes': recipes,
     }
+    return render(request, 'myapp/recipe_search.html', context)
+
+
+@cache_control(no_cache=True)
+@async_condition(etag_func=acatalog_etag)
+async def recipe_detail(request, pk):
+    """View recipe details"""
+    
+    async def load_recipe():
+        recipe = await Recipe.objects.filter(pk=pk).afirst()
+        if recipe is None:
+            return None
+        return {
+            'recipe': recipe,
+            'ingredients': [ing.strip() for ing in recipe.ingredients.split(',')],
+        }
+    
+    context = await acached_catalog(f'recipe:{pk}', load_recipe)
+    if context is None:
+        raise Http404('No Recipe matches the given query.')
     
     return render(request, 'myapp/recipe_detail.html', context)
 
@@ -229,5 +474,48 @@ def mark_grocery_purchased(request, pk):
     item = get_object_or_404(GroceryItem, pk=pk)
     item.purchased = not item.purchased
     item.save()
+    MealPlan.touch(item.meal_plan_id)
     
-    return redirect('view_grocery_list', pk=item.meal_plan.pk)
+    return redirect('myapp:view_grocery_list', pk=item.meal_plan_id)
+
+
+def editable_plan(pk):
+    return get_object_or_404(MealPlan.objects.select_related('health_goal'), pk=pk, status='ready')
+
+
+@require_POST
+def regenerate_day(request, pk, day_number):
+    """Re-pick every meal of one day of a plan"""
+    meal_plan = editable_plan(pk)
+    try:
+        replan_day(meal_plan, day_number)
+    except DailyMeal.DoesNotExist:
+        raise Http404('No such day in this meal plan.')
+    messages.success(request, f'Day {day_number} regenerated.')
+    return redirect('myapp:view_meal_plan', pk=pk)
+
+
+@require_POST
+def swap_meal_slot(request, pk, day_number, slot):
+    """Replace one meal of one day of a plan"""
+    if slot not in MEAL_SLOTS:
+        raise Http404('No such meal.')
+    meal_plan = editable_plan(pk)
+    try:
+        replan_day(meal_plan, day_number, [slot])
+    except DailyMeal.DoesNotExist:
+        raise Http404('No such day in this meal plan.')
+    messages.success(request, f'Day {day_number} {slot} swapped.')
+    return redirect('myapp:view_meal_plan', pk=pk)
+
+
+@staff_member_required
+@require_http_methods(['GET', 'POST'])
+def performance_stats(request):
+    """Per-view timing and SQL statistics of this process; POST clears them"""
+    if request.method == 'POST':
+        request_stats.reset()
+    return JsonResponse({
+        'sample_rate': getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0),
+        'views': request_stats.snapshot(),
+    })
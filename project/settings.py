@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware too
+    'myapp.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,13 +58,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process; the dev server's
+            # autoreloader still resets it when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -72,15 +81,75 @@ WSGI_APPLICATION = 'project.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# https://docs.djangoproject.com/en/5.2/ref/databases/#sqlite-notes
+#
+# Tuned for web and generation worker processes sharing one SQLite file. WAL
+# lets readers run while a writer commits; IMMEDIATE transactions take the
+# write lock when they begin, so a second writer waits up to `timeout`
+# seconds (SQLite's busy_timeout) instead of failing with "database is
+# locked" when it tries to upgrade a read lock. Connections are kept open
+# between requests so the pragmas below run once per connection, not per
+# request.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Durable against application crashes; only a power loss can drop the
+    # last commits, and it can never corrupt the database in WAL mode
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative values are KiB: a 64 MB page cache per connection
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# File-based so every worker process sees the same recipe catalog version.
+
+CACHES = {
+    # Recipe details, filtered list pages and memoized plans. Past MAX_ENTRIES
+    # a third of the files are culled at random, so keep it well above the
+    # working set.
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # The recipe catalog version alone, so culling the default cache never
+    # resets it (which would invalidate every worker's entries and ETags).
+    'catalog-version': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'catalog-version',
+    },
+    # Rendered template fragments ({% cache ... using='fragments' %}). Kept in
+    # process memory: a file read per card would cost more than rendering
+    # it. Keys carry the catalog version, so stale cards are never read.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Entries kept in each process's in-memory LRU in front of the shared cache
+RECIPE_CACHE_LOCAL_SIZE = 128
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -121,3 +190,39 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Meal planning
+# Dotted path to the PlanningEngine subclass used by generate_meal_plan, and
+# the wall-clock budget (seconds) it may spend searching for a week.
+
+MEAL_PLAN_ENGINE = 'myapp.planning.OptimizingEngine'
+
+MEAL_PLAN_TIME_BUDGET = 0.5
+
+# When True, create_health_goal only queues a GenerationJob and returns at
+# once; run `manage.py process_generation_jobs` to generate queued plans.
+
+MEAL_PLAN_ASYNC = False
+
+# Seconds after which a running GenerationJob is taken to belong to a dead
+# worker and is claimed again.
+
+GENERATION_JOB_TIMEOUT = 600
+
+
+# Request profiling
+# RequestProfilingMiddleware times every request and logs those slower than
+# REQUEST_PROFILING_SLOW_MS to 'myapp.performance'. It records the SQL of
+# this fraction of requests (0 turns recording off); sampled requests over
+# the query threshold are logged too. Staff can read the per-view statistics
+# of sampled requests at /performance/.
+
+REQUEST_PROFILING_SAMPLE_RATE = 0.0
+
+REQUEST_PROFILING_SLOW_MS = 500
+
+REQUEST_PROFILING_SLOW_QUERIES = 50
+
+# Slowest statements kept per view
+REQUEST_PROFILING_SLOWEST_STATEMENTS = 5